@@ -0,0 +1,138 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from spectrum import _read_mapped, classify_peaks, records_to_dicts, spectrum
+
+
+class SpectrumAnalysis:
+    """
+    Spectrum and harmonic classification of one analysis window.
+
+    Holds the magnitude spectrum together with f0, the bins of the peaks
+    that passed threshold and fmin, and the group A/B structured arrays
+    from classify_peaks, so the report writers and the plots can share
+    one FFT and one peak search. Once an object is put in
+    an AnalysisCache its arrays are made read only, since the same object
+    is handed to every caller.
+
+    Parameters:
+    - rate, freqs, mag: as returned by spectrum()
+    - tolerance_hz: harmonic tolerance, replaced by the tolerance at f0
+      when tolerance_cents is given
+    - the rest as for classify_peaks
+    """
+
+    def __init__(self, rate, freqs, mag, tolerance_hz, threshold=0.1, fmin=20.0, refine=None, tolerance_cents=None,
+                 profiler=None, key=0):
+        self.rate = rate
+        self.freqs = freqs
+        self.mag = mag
+        self.f0, self.groupA, self.groupB, self.peaks = classify_peaks(freqs, mag, tolerance_hz, threshold, fmin, refine,
+                                                                       tolerance_cents, profiler, key, return_peaks=True)
+        if tolerance_cents is not None and self.f0 is not None:
+            tolerance_hz = self.f0 * (2 ** (tolerance_cents / 1200) - 1) # tolerance at the fundamental
+        self.tolerance_hz = tolerance_hz
+
+    def result(self, as_records=False):
+        # the analyze_harmonics result dict, as_records keeps the structured arrays (as copies,
+        # so callers never hold the cached ones)
+        if as_records:
+            groupA, groupB = self.groupA.copy(), self.groupB.copy()
+        else:
+            groupA = records_to_dicts(self.groupA)
+            groupB = records_to_dicts(self.groupB)
+        return {
+            "f0": self.f0,
+            "tolerance_hz": self.tolerance_hz,
+            "groupA": groupA,
+            "groupB": groupB
+        }
+
+
+class AnalysisCache:
+    """
+    In-process LRU of SpectrumAnalysis objects and mapped WAV channels.
+
+    Analyses are keyed by the file (path, size and mtime, so an edited
+    file is analyzed again) and every parameter that changes the result.
+    Once more than max_entries are held the least recently used is
+    dropped, so interactive plotting of many files keeps bounded memory.
+    Only memory mapped samples are kept; files that have to be decoded
+    (24-bit) are read again when needed rather than held in full.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _file_key(self, filename):
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns
+
+    def key(self, filename, n_fft=65536, window=None, threshold=0.1, fmin=20.0, offset=0, channel=0, refine=None,
+            tolerance_cents=None):
+        return self._file_key(filename) + (n_fft, window, threshold, fmin, offset, channel, refine, tolerance_cents)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        if isinstance(entry, SpectrumAnalysis):
+            # shared from now on, the arrays belong to the cache
+            for a in (entry.mag, entry.peaks, entry.groupA, entry.groupB):
+                a.flags.writeable = False
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def samples(self, filename, channel=0):
+        # rate and one channel of the whole file, memory mapped where the format allows
+        key = self._file_key(filename) + ("samples", channel)
+        entry = self.get(key)
+        if entry is None:
+            rate, data = _read_mapped(filename)
+            mapped = isinstance(data, np.memmap)
+            if data.ndim > 1:
+                data = data[:, channel]
+            entry = (rate, data)
+            if mapped:
+                self.put(key, entry)
+        return entry
+
+    def analyze(self, filename, n_fft=65536, window=None, threshold=0.1, fmin=20.0, offset=0, channel=0, refine=None,
+                tolerance_cents=None):
+        # the cached analysis, computed from the cached samples on a miss
+        key = self.key(filename, n_fft, window, threshold, fmin, offset, channel, refine, tolerance_cents)
+        entry = self.get(key)
+        if entry is None:
+            rate, data = self.samples(filename, channel)
+            rate, freqs, mag = spectrum((rate, data), n_fft, offset, 0, window)
+            entry = SpectrumAnalysis(rate, freqs, mag, rate/n_fft, threshold, fmin, refine, tolerance_cents)
+            self.put(key, entry)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+DEFAULT_CACHE = AnalysisCache()
+
+def analysis(filename, n_fft=65536, window=None, threshold=0.1, fmin=20.0, offset=0, channel=0, refine=None,
+             tolerance_cents=None, cache=DEFAULT_CACHE):
+    # shared SpectrumAnalysis of a file from the process wide cache
+    return cache.analyze(filename, n_fft, window, threshold, fmin, offset, channel, refine, tolerance_cents)
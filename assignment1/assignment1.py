@@ -3,196 +3,297 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import find_peaks
-from scipy.io import wavfile
 import os
 import glob
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+from analysis_cache import DEFAULT_CACHE, SpectrumAnalysis, analysis
+from harmonic_cache import HarmonicCache
+from notes import DEFAULT_TABLE
+from profiling import Profiler
+from result_writers import DetailedReportWriter, SummaryTableWriter, write_results, writer_for
+from segment_archive import SegmentArchive
+from spectrum import batch_spectra, spectrum
 
-def analyze_harmonics(filename, threshold=0.1, n_fft=65536, fmin=20.0, plot=False):
-    rate, data = wavfile.read(filename)
-    n = len(data)
+def analyze_harmonics(filename, threshold=0.1, n_fft=65536, fmin=20.0, plot=False, as_records=False, offset=0, channel=0,
+                      refine=None, window=None, tolerance_cents=2.0, profiler=None):
+    # offset is the first sample of the analysis window, e.g. to skip the attack
+    # refine ("log" or "quadratic") interpolates peaks between bins, see _refine_options
+    # profiler (a profiling.Profiler) collects per stage timings for this file
+    # without a profiler the analysis of a path is shared through analysis_cache with the plots
+    window, tolerance_cents = _refine_options(refine, window, tolerance_cents)
+    if profiler is None and not isinstance(filename, tuple):
+        return analysis(filename, n_fft, window, threshold, fmin, offset, channel, refine, tolerance_cents).result(as_records)
+    rate, freqs, mag = spectrum(filename, n_fft, offset, channel, window, profiler)
+    result = harmonics_from_spectrum(freqs, mag, rate/n_fft, threshold, fmin, as_records, refine, tolerance_cents,
+                                     profiler)
+    if profiler is not None:
+        profiler.finish([filename])
+    return result
 
-    if n < n_fft:
-        x = np.pad(data, (0, n_fft - n))
-    else:
-        x = data[:n_fft]
+def _refine_options(refine, window, tolerance_cents):
+    # refined analysis uses a Hann window and a tolerance in cents around k * f0,
+    # the plain analysis keeps the rectangular window and the bin width tolerance
+    if refine is None:
+        return window, None
+    return window or "hann", tolerance_cents
+
+def harmonics_from_spectrum(freqs, mag, tolerance_hz, threshold=0.1, fmin=20.0, as_records=False, refine=None,
+                            tolerance_cents=None, profiler=None, key=0):
+    # as_records keeps groupA/groupB as structured arrays instead of lists of dicts
+    return SpectrumAnalysis(None, freqs, mag, tolerance_hz, threshold, fmin, refine, tolerance_cents,
+                            profiler, key).result(as_records)
 
-    X = np.fft.fft(x)
-    freqs = np.fft.fftfreq(n_fft, 1/rate)
-    mag = np.abs(X)
-    freqs = freqs[:n_fft // 2]
-    mag = mag[:n_fft // 2]
+def frequency_to_note_and_cents(frequency, table=DEFAULT_TABLE):
+    # scalar wrapper around NoteTable.lookup
+    notes = table.lookup(frequency)
+    return str(table.names(notes)), float(notes["theoretical"]), float(notes["cents"])
 
-    peaks, _ = find_peaks(mag) # finding the local maxima
-    max_mag = mag[peaks].max() # strongest peak magnitude
-    strong = [p for p in peaks if mag[p] >= threshold * max_mag] # keeping peaks above a certain threshold
-    strong_sorted = sorted(strong, key=lambda i: freqs[i]) # sorting by frequency
-    strong_sorted = [i for i in strong_sorted if freqs[i] >= fmin] # discarding weaker peaks
+def _analyze_sources(labels, sources, kwargs, profile=False, share=False):
+    # errors are returned instead of raised so the worker survives,
+    # with profile the per file stage records are returned as well,
+    # with share analyses of paths are kept in the process wide analysis cache
+    p = _analysis_params(kwargs)
+    n_fft = p["n_fft"]
+    window, tolerance_cents = _refine_options(p["refine"], p["window"], p["tolerance_cents"])
+    profiler = Profiler() if profile else None
 
+    results = []
+    spectra = batch_spectra(sources, n_fft, len(sources), p["offset"], p["channel"], window, profiler)
+    for key, (label, (_, rate, freqs, mag, error)) in enumerate(zip(labels, spectra)):
+        if error is not None:
+            results.append((label, None, str(error)))
+            continue
+        try:
+            entry = SpectrumAnalysis(rate, freqs, mag, rate/n_fft, p["threshold"], p["fmin"], p["refine"], tolerance_cents,
+                                     profiler, key)
+            if share and isinstance(label, str) and os.path.isfile(label):
+                DEFAULT_CACHE.put(DEFAULT_CACHE.key(label, n_fft, window, p["threshold"], p["fmin"], p["offset"],
+                                                    p["channel"], p["refine"], tolerance_cents), entry)
+            results.append((label, entry.result(p["as_records"]), None))
+        except Exception as e:
+            results.append((label, None, str(e)))
+    return results, (profiler.finish(labels) if profile else None)
 
-    max_peak_idx = max(strong_sorted, key=lambda i: mag[i])
-    f0 = freqs[max_peak_idx] # fundamental frequency is the largest magnitude peak
-    mag0 = mag[max_peak_idx] # magnitude of fundamental peak
+def _analyze_chunk(args):
+    # runs inside a worker, or in this process with share set
+    filenames, kwargs, profile, share = args
+    return _analyze_sources(filenames, filenames, kwargs, profile, share)
 
-    tolerance_hz = rate/n_fft # the bin wdith
+def _analyze_archive_chunk(args):
+    # runs inside a worker, each worker maps the archive itself
+    archive_dir, names, kwargs, profile = args
+    archive = SegmentArchive(archive_dir)
+    return _analyze_sources(names, [archive.segment(name) for name in names], kwargs, profile)
 
-    groupA, groupB = [], [] # splitting into harmonics and non-harmonics
-    for idx in strong_sorted: # checking every frequency that was kept
-        f = freqs[idx] # peak freq
-        if f < f0 - tolerance_hz: # skipping if the freq is below fundamental
-            continue
-        k = int(round(f / f0)) # finding the harmonic number
-        if k < 1: # adding to group B if less than fundamental
-            groupB.append({"frequency": f, "magnitude": mag[idx]})
+def _find_files(files):
+    if isinstance(files, str):
+        files = glob.glob(files)
+    return sorted(files)
+
+def _analysis_params(kwargs):
+    # the parameters that change the analysis output, defaults filled in
+    params = inspect.signature(analyze_harmonics).parameters
+    unknown = sorted(set(kwargs) - set(params) - {"plot"})
+    if unknown:
+        # a misspelled option would otherwise give (and cache) a default parameter result
+        raise TypeError(f"Unknown analysis parameter(s): {', '.join(unknown)}")
+    return {name: kwargs.get(name, p.default) for name, p in params.items() if name not in ("filename", "plot", "profiler")}
+
+def _iter_jobs(files, kwargs, workers, chunk_size=32, archive_dir=None, profiler=None):
+    # files are split into chunks, each chunk is one batched FFT in a worker,
+    # results are yielded in order as soon as their chunk is done
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+    chunk_size = max(1, min(chunk_size, -(-len(files) // workers)))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    profile = profiler is not None
+    if archive_dir is None:
+        # only an in-process run can reuse its analyses for plotting afterwards
+        worker, jobs = _analyze_chunk, [(chunk, kwargs, profile, workers == 1) for chunk in chunks]
+    else:
+        worker, jobs = _analyze_archive_chunk, [(archive_dir, chunk, kwargs, profile) for chunk in chunks]
+
+    if workers == 1:
+        outputs = map(worker, jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        outputs = pool.map(worker, jobs)
+
+    try:
+        for results, records in outputs:
+            if profile:
+                profiler.merge(records)
+            yield from results
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def iter_analyze_files(files, workers=None, cache=None, chunk_size=32, profiler=None, **kwargs):
+    # analyzes every file once, yields (filename, result, error) in sorted filename order
+    files = _find_files(files)
+    kwargs.pop("plot", None)
+    params = _analysis_params(kwargs) # raises on unknown options before any work starts
+    if not files:
+        return
+
+    if cache is None:
+        yield from _iter_jobs(files, kwargs, workers, chunk_size, profiler=profiler)
+        return
+
+    # only new or changed files go to the workers
+    cached = {}
+    for filename in files:
+        try:
+            result = cache.get(filename, params)
+        except OSError as e:
+            cached[filename] = (filename, None, str(e))
             continue
+        if result is not None:
+            cached[filename] = (filename, result, None)
+
+    misses = [filename for filename in files if filename not in cached]
+    if misses:
+        print(f"Analyzing {len(misses)} new or changed files ({len(files) - len(misses)} cached)")
+    computed = _iter_jobs(misses, kwargs, workers, chunk_size, profiler=profiler) if misses else iter(())
+
+    try:
+        for filename in files:
+            if filename in cached:
+                if profiler is not None:
+                    profiler.merge([{"file": filename, "cached": 1}])
+                yield cached[filename]
+                continue
+            item = next(computed)
+            if item[2] is None:
+                cache.put(filename, params, item[1])
+            yield item
+        if misses:
+            cache.evict()
+    finally:
+        cache.save_index()
+
+def analyze_files(files, workers=None, cache=None, chunk_size=32, profiler=None, **kwargs):
+    return list(iter_analyze_files(files, workers, cache, chunk_size, profiler, **kwargs))
+
+def iter_analyze_archive(archive_dir, workers=None, chunk_size=32, profiler=None, **kwargs):
+    # same as iter_analyze_files for every segment of a SegmentArchive, in archive order
+    kwargs.pop("plot", None)
+    _analysis_params(kwargs)
+    names = SegmentArchive(archive_dir).names
+    if names:
+        yield from _iter_jobs(names, kwargs, workers, chunk_size, archive_dir, profiler)
+
+def analyze_archive(archive_dir, workers=None, chunk_size=32, profiler=None, **kwargs):
+    return list(iter_analyze_archive(archive_dir, workers, chunk_size, profiler, **kwargs))
+
+def write_detailed_report(results, output_file="harmonic_analysis_results.txt", partial_notes=False, table=DEFAULT_TABLE):
+    # partial_notes adds the nearest note and its cents deviation to every group A partial
+    write_results(results, [DetailedReportWriter(output_file, partial_notes, table)])
+
+def write_summary_table(results, output_file="summary_table.txt", table=DEFAULT_TABLE):
+    write_results(results, [SummaryTableWriter(output_file, table)])
+
+def process_multiple_files(files, output_file="harmonic_analysis_results.txt", workers=None, cache=None, partial_notes=False,
+                           **kwargs):
+    pattern = files
+    files = _find_files(files)
 
-        f_ideal = k * f0 # calculating the deviation from an ideal harmonic frequency
-        dev_hz = f - f_ideal
-        if abs(dev_hz) <= tolerance_hz: # if it is close enough, calculate the deviations and add to group A
-
-            dev_cents = 1200.0 * np.log2(f/f_ideal)
-            level_db = 20.0 * np.log10(mag[idx]/mag0)
-            groupA.append({
-                "k": k,
-                "frequency": f,
-                "magnitude": mag[idx],
-                "deviation_hz": dev_hz,
-                "deviation_cents": dev_cents,
-                "level_db_rel_f0": level_db
-            })
-
-        else:
-            groupB.append({"frequency": f, "magnitude": mag[idx]}) # if not close enough, add to group B
-
-    return {
-        "f0": f0,
-        "tolerance_hz": tolerance_hz,
-        "groupA": sorted(groupA, key=lambda d: d["k"]),
-        "groupB": groupB
-    }
-
-def frequency_to_note_and_cents(frequency):
-    
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-
-    A4 = 440.0
-    semitones_from_A4 = 12 * np.log2(frequency / A4)
-    closest_semitone = round(semitones_from_A4)
-    
-    note_index = (9 + closest_semitone) % 12
-    octave = 4 + (9 + closest_semitone) // 12
-    note_name = note_names[note_index]
-    
-    theoretical_freq = A4 * (2 ** (closest_semitone / 12))
-    cents_deviation = 1200 * np.log2(frequency / theoretical_freq)
-    return f"{note_name}{octave}", theoretical_freq, cents_deviation
-
-def process_multiple_files(files, output_file="harmonic_analysis_results.txt", **kwargs):
-
-    files = glob.glob(files)
-    files.sort()
-    
     if not files:
-        print(f"No files found matching pattern: {files}")
+        print(f"No files found matching pattern: {pattern}")
         return
-    
+
     print(f"Found {len(files)} files to process")
-    
-    with open(output_file, 'w') as f:
-        f.write("Harmonic analysis\n")
-        f.write("=" * 50 + "\n\n")
-        
-        for i, filename in enumerate(files, 1):
-            print(f"Processing {i}/{len(files)}: {os.path.basename(filename)}")
-            
-            try:
-                # Analyze the file
-                result = analyze_harmonics(filename, **kwargs)
-                
-                # Write results to file
-                f.write(f"File {i}: {os.path.basename(filename)}\n")
-                f.write("-" * 40 + "\n")
-                
-                if result["f0"] is None:
-                    f.write("No fundamental frequency detected.\n\n")
-                    continue
-                
-                # Get musical note information
-                note, theoretical_freq, cents_dev = frequency_to_note_and_cents(result["f0"])
-                
-                f.write(f"Fundamental frequency (f0): {result['f0']:.3f} Hz\n")
-                f.write(f"Frequency resolution: {result['tolerance_hz']:.3f} Hz\n")
-                f.write(f"Tolerance: ±{result['tolerance_hz']:.3f} Hz\n")
-                
-                if note:
-                    f.write(f"Musical note: {note}\n")
-                    f.write(f"Theoretical frequency: {theoretical_freq:.3f} Hz\n")
-                    f.write(f"Deviation from equal temperament: {cents_dev:+.2f} cents\n")
-                
-                f.write(f"\nGroup A (Harmonics): {len(result['groupA'])} peaks\n")
-                f.write("k   Frequency [Hz]   Dev [Hz]   Dev [cents]   Level [dB]\n")
-                for p in result["groupA"]:
-                    f.write(f"{p['k']:>2d}  {p['frequency']:>11.3f}   {p['deviation_hz']:>+8.3f}   {p['deviation_cents']:>+8.2f}   {p['level_db_rel_f0']:>+8.2f}\n")
-                
-                if result["groupB"]:
-                    f.write(f"\nGroup B (Non-harmonic): {len(result['groupB'])} peaks\n")
-                    f.write("Frequencies [Hz]: ")
-                    f.write(", ".join(f"{p['frequency']:.2f}" for p in result["groupB"]))
-                    f.write("\n")
-                
-                f.write("\n" + "="*50 + "\n\n")
-                
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
-                f.write(f"ERROR processing file: {e}\n\n")
-    
-    print(f"Results written to: {output_file}")
-
-def create_summary_table(files, output_file="summary_table.txt", **kwargs):
-    files = glob.glob(files)
-    files.sort()
-    
+    results = analyze_files(files, workers=workers, cache=cache, **kwargs)
+    write_detailed_report(results, output_file, partial_notes)
+    return results
+
+def create_summary_table(files, output_file="summary_table.txt", workers=None, cache=None, **kwargs):
+    pattern = files
+    files = _find_files(files)
+
     if not files:
-        print(f"No files found matching pattern: {files}")
+        print(f"No files found matching pattern: {pattern}")
         return
-    
+
+    results = analyze_files(files, workers=workers, cache=cache, **kwargs)
+    write_summary_table(results, output_file)
+    return results
+
+def compare_resolution(files, output_file="resolution_comparison.txt", n_fft=8192, refine="log", ref_n_fft=65536,
+                       workers=None, **kwargs):
+    # accuracy of a short refined transform against the plain ref_n_fft analysis
+    ref = analyze_files(files, workers=workers, n_fft=ref_n_fft, **kwargs)
+    new = analyze_files(files, workers=workers, n_fft=n_fft, refine=refine, **kwargs)
+
+    f0_errors, partial_errors = [], []
     with open(output_file, 'w') as f:
-        f.write("Fundamental frequencies and musical notes\n")
+        f.write(f"Refined {n_fft}-point ({refine}) vs plain {ref_n_fft}-point analysis\n")
         f.write("=" * 80 + "\n\n")
-        f.write(f"{'File':<30} {'f0 [Hz]':<10} {'Note':<6} {'Theoretical [Hz]':<15} {'Deviation [cents]':<15}\n")
+        f.write(f"{'File':<30} {'f0 ref [Hz]':<12} {'f0 new [Hz]':<12} {'f0 diff [cents]':<16} {'Partials':<9} {'Max dev diff [cents]':<12}\n")
         f.write("-" * 80 + "\n")
-        
-        for filename in files:
-            try:
-                result = analyze_harmonics(filename, plot=False, **kwargs)
-                
-                if result["f0"] is None:
-                    f.write(f"{os.path.basename(filename):<30} {'N/A':<10} {'N/A':<6} {'N/A':<15} {'N/A':<15}\n")
-                    continue
-                
-                note, theoretical_freq, cents_dev = frequency_to_note_and_cents(result["f0"])
-                
-                f.write(f"{os.path.basename(filename):<30} {result['f0']:<10.3f} {note or 'N/A':<6} ")
-                f.write(f"{theoretical_freq or 0:<15.3f} {cents_dev or 0:<+15.2f}\n")
-                
-            except Exception as e:
-                f.write(f"{os.path.basename(filename):<30} ERROR: {str(e)}\n")
-    
-    print(f"Summary table written to: {output_file}")
+
+        for (filename, r, err_r), (_, n, err_n) in zip(ref, new):
+            name = os.path.basename(filename)
+            if err_r or err_n or r["f0"] is None or n["f0"] is None:
+                f.write(f"{name:<30} ERROR: {err_r or err_n or 'no fundamental'}\n")
+                continue
+
+            f0_diff = 1200 * np.log2(n["f0"] / r["f0"])
+            f0_errors.append(abs(f0_diff))
+
+            # compare cents deviations of the partials found by both
+            dev_ref = {p["k"]: p["deviation_cents"] for p in r["groupA"]}
+            diffs = [abs(p["deviation_cents"] - dev_ref[p["k"]]) for p in n["groupA"] if p["k"] in dev_ref]
+            partial_errors.extend(diffs)
+            max_diff = f"{max(diffs):.2f}" if diffs else "N/A"
+
+            f.write(f"{name:<30} {r['f0']:<12.3f} {n['f0']:<12.3f} {f0_diff:<+16.2f} {len(diffs):<9d} {max_diff:<12}\n")
+
+        if f0_errors:
+            f.write("-" * 80 + "\n")
+            f.write(f"f0: mean |diff| {np.mean(f0_errors):.2f} cents, max {np.max(f0_errors):.2f} cents\n")
+        if partial_errors:
+            f.write(f"Partials: mean |dev diff| {np.mean(partial_errors):.2f} cents, max {np.max(partial_errors):.2f} cents\n")
+
+    print(f"Resolution comparison written to: {output_file}")
+    return f0_errors, partial_errors
+
+def stream_analysis(files, writers, workers=None, cache=None, profiler=None, **kwargs):
+    # every result goes to all writers as soon as it is analyzed, nothing is held
+    writers = [writer_for(w) if isinstance(w, str) else w for w in writers]
+    results = iter_analyze_files(files, workers=workers, cache=cache, profiler=profiler, **kwargs)
+    write_results(results, writers, profiler)
+
+def run_batch(files, detailed_file="detailed_harmonic_analysis.txt", summary_file="summary_table.txt", workers=None, cache=None,
+              partial_notes=False, outputs=(), profiler=None, **kwargs):
+    # one analysis pass shared by both reports, outputs adds more writers or
+    # files such as "results.jsonl", "results.csv" or "partials.npz"
+    pattern = files
+    files = _find_files(files)
+
+    if not files:
+        print(f"No files found matching pattern: {pattern}")
+        return
+
+    print(f"Found {len(files)} files to process")
+    writers = [DetailedReportWriter(detailed_file, partial_notes), SummaryTableWriter(summary_file)]
+    stream_analysis(files, writers + list(outputs), workers, cache, profiler, **kwargs)
+
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.report())
 
 
 if __name__ == "__main__":
     files = "/Users/joshjude/Documents/Git/ttt4295/assignment1/music_box_tones_k/*.wav"
-    process_multiple_files(
-        files,
-        output_file="detailed_harmonic_analysis.txt",
-        threshold=0.1,
-        n_fft=65536
-    )
-    
-    create_summary_table(
+    run_batch(
         files,
-        output_file="summary_table.txt",
+        cache=HarmonicCache(".harmonic_cache"),
+        detailed_file="detailed_harmonic_analysis.txt",
+        summary_file="summary_table.txt",
         threshold=0.1,
         n_fft=65536
     )
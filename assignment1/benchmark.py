@@ -0,0 +1,194 @@
+## Benchmark for the harmonic analysis pipeline
+## Generates synthetic music box tones with known f0 and partials, times every
+## analysis stage and checks the estimates against the ground truth.
+##
+##   python benchmark.py --output bench.json
+##   python benchmark.py --quick --compare bench.json
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import find_peaks, get_window
+from assignment1 import analyze_files, write_detailed_report, write_summary_table, _refine_options
+from spectrum import _split_peaks, read_window, rfft_freqs
+
+CASES = {
+    "rate": [22050, 44100, 48000],
+    "duration": [0.5, 2.0, 8.0],
+    "n_files": [8, 64],
+}
+QUICK_CASES = {
+    "rate": [44100],
+    "duration": [0.5, 2.0],
+    "n_files": [8],
+}
+
+
+def synth_tone(rate, duration, f0, n_partials=6, inharmonicity=2e-4, decay=4.0, noise_db=-60.0, rng=None):
+    # decaying partials at k * f0 * sqrt(1 + B k^2), returns int16 samples and the partial frequencies
+    rng = rng or np.random.default_rng()
+    t = np.arange(int(duration * rate)) / rate
+    k = np.arange(1, n_partials + 1)
+    partials = k * f0 * np.sqrt(1 + inharmonicity * k**2)
+    partials = partials[partials < rate / 2 * 0.9]
+
+    x = np.zeros_like(t)
+    for i, fk in enumerate(partials):
+        amp = 1.0 / (i + 1)
+        phase = rng.uniform(0, 2 * np.pi)
+        x += amp * np.exp(-decay * (i + 1) * t) * np.sin(2 * np.pi * fk * t + phase)
+    x += 10 ** (noise_db / 20) * rng.standard_normal(len(t))
+
+    x *= 0.9 * 32767 / np.max(np.abs(x))
+    return x.astype(np.int16), partials
+
+def make_corpus(directory, n_files, rate, duration, seed=0):
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(n_files):
+        f0 = float(np.exp(rng.uniform(np.log(400), np.log(2000))))
+        samples, partials = synth_tone(rate, duration, f0, rng=rng)
+        filename = os.path.join(directory, f"tone_{i:04d}.wav")
+        wavfile.write(filename, rate, samples)
+        corpus.append({"filename": filename, "f0": f0, "partials": partials})
+    return corpus
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+def bench_stages(corpus, n_fft=65536, threshold=0.1, fmin=20.0, refine=None):
+    # runs the pipeline one stage at a time so each stage can be timed on its own
+    window, tolerance_cents = _refine_options(refine, None, 2.0)
+    times = {"read": 0.0, "fft": 0.0, "peaks": 0.0, "classify": 0.0}
+    f0_errors, partial_errors = [], []
+    n_peaks = 0
+    bytes_read = 0
+
+    for item in corpus:
+        (rate, x), dt = _timed(read_window, item["filename"], n_fft)
+        times["read"] += dt
+        bytes_read += x.nbytes
+
+        start = time.perf_counter()
+        X = np.zeros(n_fft)
+        X[:len(x)] = x
+        if window is not None:
+            X *= get_window(window, n_fft)
+        mag = np.abs(np.fft.rfft(X)[:n_fft // 2])
+        freqs = rfft_freqs(rate, n_fft)
+        times["fft"] += time.perf_counter() - start
+
+        (peaks, _), dt = _timed(find_peaks, mag)
+        times["peaks"] += dt
+        n_peaks += len(peaks)
+
+        # classification alone, on the peaks found above
+        (f0, groupA, _), dt = _timed(_split_peaks, freqs, mag, peaks, rate/n_fft, threshold, fmin, refine, tolerance_cents)
+        times["classify"] += dt
+
+        if f0 is None:
+            continue
+        # the first partial is at f0 * sqrt(1 + B), that is what the analysis should find
+        truth = item["partials"]
+        f0_errors.append(1200 * np.log2(f0 / truth[0]))
+
+        # deviation of each found harmonic against the true partial with the same k
+        for p in groupA:
+            if p["k"] <= len(truth):
+                true_cents = 1200 * np.log2(truth[p["k"] - 1] / (p["k"] * truth[0]))
+                partial_errors.append(p["deviation_cents"] - true_cents)
+
+    f0_errors = np.abs(f0_errors)
+    partial_errors = np.abs(partial_errors)
+    return {
+        "seconds": times,
+        "peaks": int(n_peaks),
+        "bytes_read": int(bytes_read),
+        "f0_error_cents_mean": float(f0_errors.mean()) if len(f0_errors) else None,
+        "f0_error_cents_max": float(f0_errors.max()) if len(f0_errors) else None,
+        "partial_error_cents_mean": float(partial_errors.mean()) if len(partial_errors) else None,
+        "partials_matched": int(len(partial_errors)),
+    }
+
+def bench_batch(corpus, directory, workers=None, **kwargs):
+    # end to end: batched analysis plus both text reports
+    files = [item["filename"] for item in corpus]
+    results, analyze_s = _timed(analyze_files, files, workers=workers, **kwargs)
+    _, detailed_s = _timed(write_detailed_report, results, os.path.join(directory, "detailed.txt"))
+    _, summary_s = _timed(write_summary_table, results, os.path.join(directory, "summary.txt"))
+    return {
+        "analyze_files": analyze_s,
+        "write_detailed_report": detailed_s,
+        "write_summary_table": summary_s,
+        "files_per_s": len(files) / analyze_s,
+    }
+
+def run(cases, n_fft=65536, refine=None, workers=None, seed=0):
+    results = []
+    for rate in cases["rate"]:
+        for duration in cases["duration"]:
+            for n_files in cases["n_files"]:
+                with tempfile.TemporaryDirectory() as directory:
+                    corpus = make_corpus(directory, n_files, rate, duration, seed)
+                    case = {"rate": rate, "duration": duration, "n_files": n_files, "n_fft": n_fft, "refine": refine}
+                    case["stages"] = bench_stages(corpus, n_fft, refine=refine)
+                    case["batch"] = bench_batch(corpus, directory, workers, n_fft=n_fft, refine=refine)
+                results.append(case)
+                stages = case["stages"]
+                print(f"rate={rate:<6d} dur={duration:<4.1f}s files={n_files:<4d} "
+                      f"read={stages['seconds']['read']:.4f}s fft={stages['seconds']['fft']:.4f}s "
+                      f"peaks={stages['seconds']['peaks']:.4f}s classify={stages['seconds']['classify']:.4f}s "
+                      f"batch={case['batch']['files_per_s']:.1f} files/s "
+                      f"f0 err={stages['f0_error_cents_mean'] or float('nan'):.3f} cents")
+    return results
+
+def _case_key(case):
+    return (case["rate"], case["duration"], case["n_files"], case["n_fft"], case["refine"])
+
+def compare(new, old):
+    # speedup of every stage against a previous run, >1 means faster now
+    old_cases = {_case_key(c): c for c in old["cases"]}
+    for case in new["cases"]:
+        prev = old_cases.get(_case_key(case))
+        if prev is None:
+            continue
+        ratios = {s: prev["stages"]["seconds"][s] / max(case["stages"]["seconds"][s], 1e-12) for s in case["stages"]["seconds"]}
+        ratios["batch"] = case["batch"]["files_per_s"] / prev["batch"]["files_per_s"]
+        print(f"rate={case['rate']:<6d} dur={case['duration']:<4.1f}s files={case['n_files']:<4d} "
+              + " ".join(f"{s}={r:.2f}x" for s, r in ratios.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the harmonic analysis pipeline on synthetic tones")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--quick", action="store_true", help="run a small subset of the cases")
+    parser.add_argument("--n-fft", type=int, default=65536)
+    parser.add_argument("--refine", choices=["log", "quadratic"], default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", default=None, help="previous results file to compare against")
+    args = parser.parse_args()
+
+    cases = run(QUICK_CASES if args.quick else CASES, args.n_fft, args.refine, args.workers, args.seed)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cases": cases,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import pickle
+
+CACHE_VERSION = 1 # bump when the analysis output changes so old entries are ignored
+
+
+def file_digest(filename, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class HarmonicCache:
+    """
+    On-disk cache of analyze_harmonics results.
+
+    Entries are stored under the sha256 of the audio file, one per set
+    of analysis parameters. A small index maps (path, size, mtime) to the
+    digest so unchanged files are not re-hashed on every run. Once the cache grows
+    past max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir=".harmonic_cache", max_bytes=256 * 1024**2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index_file = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+        self._index_dirty = False
+
+    def _load_index(self):
+        try:
+            with open(self._index_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        if not self._index_dirty:
+            return
+        tmp = self._index_file + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_file)
+        self._index_dirty = False
+
+    def digest(self, filename):
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        entry = self._index.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self._index[path] = [st.st_size, st.st_mtime_ns, digest]
+        self._index_dirty = True
+        return digest
+
+    def _entry_path(self, filename, params):
+        # one directory per audio digest, one entry per parameter set
+        raw = f"{CACHE_VERSION}:" + json.dumps(params, sort_keys=True)
+        name = hashlib.sha256(raw.encode()).hexdigest()[:32] + ".pkl"
+        return os.path.join(self.cache_dir, self.digest(filename), name)
+
+    def get(self, filename, params):
+        path = self._entry_path(filename, params)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path) # mark as recently used for eviction
+        return result
+
+    def put(self, filename, params, result):
+        path = self._entry_path(filename, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {k: result[k] for k in ("f0", "tolerance_hz", "groupA", "groupB")}
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def _entries(self):
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".pkl"):
+                    yield e
+
+    def _remove(self, path):
+        os.remove(path)
+        try:
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass # directory still holds entries for other parameters
+
+    def evict(self):
+        # drop least recently used entries until the cache fits in max_bytes
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def invalidate(self, filename):
+        # drop every cached result for this file's contents
+        digest_dir = os.path.join(self.cache_dir, self.digest(filename))
+        if os.path.isdir(digest_dir):
+            for e in list(os.scandir(digest_dir)):
+                self._remove(e.path)
+        self._index.pop(os.path.abspath(filename), None)
+        self._index_dirty = True
+
+    def clear(self):
+        for e in list(self._entries()):
+            self._remove(e.path)
+        self._index = {}
+        self._index_dirty = True
+        self.save_index()
@@ -0,0 +1,58 @@
+import numpy as np
+
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+
+NOTE_DTYPE = np.dtype([
+    ("semitone", np.int64), # semitones from the reference A4
+    ("note_index", np.int64), # index into the note names, C = 0
+    ("octave", np.int64),
+    ("theoretical", np.float64),
+    ("cents", np.float64),
+])
+
+
+class NoteTable:
+    """
+    Equal temperament lookup for arrays of frequencies.
+
+    The note names and the frequencies of every semitone between
+    min_semitone and max_semitone from A4 are computed once. lookup()
+    maps any array of frequencies to the nearest note in one vectorized
+    pass, semitones outside the table fall back to the closed form.
+    """
+
+    def __init__(self, a4=440.0, note_names=NOTE_NAMES, min_semitone=-69, max_semitone=70):
+        self.a4 = a4
+        self.note_names = np.asarray(note_names)
+        self.min_semitone = min_semitone
+        self.semitones = np.arange(min_semitone, max_semitone + 1)
+        self.frequencies = a4 * 2.0 ** (self.semitones / 12)
+        self.labels = np.array([f"{self.note_names[(9 + s) % 12]}{4 + (9 + s) // 12}" for s in self.semitones])
+
+    def lookup(self, frequencies):
+        f = np.asarray(frequencies, dtype=np.float64)
+        semitone = np.rint(12 * np.log2(f / self.a4)).astype(np.int64)
+
+        pos = semitone - self.min_semitone
+        inside = (pos >= 0) & (pos < len(self.semitones))
+        theoretical = np.where(inside, self.frequencies[np.clip(pos, 0, len(self.semitones) - 1)],
+                               self.a4 * 2.0 ** (semitone / 12))
+
+        notes = np.empty(f.shape, NOTE_DTYPE)
+        notes["semitone"] = semitone
+        notes["note_index"] = (9 + semitone) % 12
+        notes["octave"] = 4 + (9 + semitone) // 12
+        notes["theoretical"] = theoretical
+        notes["cents"] = 1200 * np.log2(f / theoretical)
+        return notes
+
+    def names(self, notes):
+        # note labels such as "A4" for the output of lookup
+        pos = notes["semitone"] - self.min_semitone
+        inside = (pos >= 0) & (pos < len(self.semitones))
+        if np.all(inside):
+            return self.labels[pos]
+        return np.array([f"{self.note_names[i]}{o}" for i, o in zip(np.ravel(notes["note_index"]), np.ravel(notes["octave"]))]).reshape(np.shape(notes))
+
+
+DEFAULT_TABLE = NoteTable()
@@ -1,78 +1,76 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import find_peaks
-from scipy.io import wavfile
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from analysis_cache import DEFAULT_CACHE
 
-def plot_waveform(filename, file_number, n_fft=16384):
-    rate, data = wavfile.read(filename)
-    if data.ndim > 1:
-        data = data[:, 0]
+def minmax_envelope(data, columns):
+    # min and max of each of `columns` equal slices, interleaved so a single
+    # line plot draws the same outline as every sample would at that width
+    n = len(data)
+    edges = np.linspace(0, n, columns + 1).astype(np.int64)[:-1]
+    lo = np.minimum.reduceat(data, edges)
+    hi = np.maximum.reduceat(data, edges)
+    env = np.empty(2 * columns, dtype=data.dtype)
+    env[0::2] = lo
+    env[1::2] = hi
+    return np.repeat(edges, 2), env
+
+def _finish(output_file, dpi):
+    # interactive window, or write the figure and free it for batch rendering
+    if output_file is None:
+        plt.show()
+    else:
+        plt.savefig(output_file, dpi=dpi)
+        plt.close()
+
+# both plots take their samples and spectrum from the shared analysis cache, so plotting a
+# file after analyzing it (or plotting it again) neither re-reads the file nor re-runs the FFT
+
+def plot_waveform(filename, file_number, n_fft=16384, offset=0, channel=0, output_file=None, max_columns=2000, dpi=100,
+                  cache=DEFAULT_CACHE):
+    rate, data = cache.samples(filename, channel)
+    n = len(data)
     
-    time = np.arange(len(data)) / rate
+    # long files are drawn from a min/max envelope at roughly screen resolution
+    if n > 2 * max_columns:
+        idx, data = minmax_envelope(data, max_columns)
+        time = idx / rate
+    else:
+        time = np.arange(n) / rate
     
     plt.figure(figsize=(10, 4))
     plt.plot(time, data, 'b-', linewidth=0.8)
     
-    if len(data) >= n_fft:
-        fft_time_end = time[n_fft-1]
-        plt.axvspan(0, fft_time_end, alpha=0.3, color='red', label=f'FFT window')
+    if n >= offset + n_fft:
+        plt.axvspan(offset / rate, (offset + n_fft - 1) / rate, alpha=0.3, color='red', label=f'FFT window')
     
     plt.xlabel('Time [s]')
     plt.ylabel('Amplitude')
     plt.title(f'Waveform for audio recording {file_number}')
     plt.grid(True)
     plt.legend()
-    plt.show()
-
-def plot_spectrum(filename, file_number, n_fft=16384, fmin=20.0, threshold=0.1):
-    rate, data = wavfile.read(filename)
-    if data.ndim > 1:
-        data = data[:, 0]
-
-    if len(data) < n_fft:
-        x = np.pad(data, (0, n_fft - len(data)))
-    else:
-        x = data[:n_fft]
+    _finish(output_file, dpi)
 
-    X = np.fft.fft(x)
-    freqs = np.fft.fftfreq(n_fft, 1/rate)[:n_fft//2]
-    mag = np.abs(X[:n_fft//2])
+def plot_spectrum(filename, file_number, n_fft=16384, fmin=20.0, threshold=0.1, offset=0, channel=0, output_file=None,
+                  dpi=100, cache=DEFAULT_CACHE):
+    analysis = cache.analyze(filename, n_fft, None, threshold, fmin, offset, channel)
+    f0, freqs, mag = analysis.f0, analysis.freqs, analysis.mag
     
     # Convert to dB
     mag_db = 20 * np.log10(mag + 1e-12)  # Add small value to avoid log(0)
 
-    peaks, _ = find_peaks(mag, height=0.1*np.max(mag))
+    peaks = analysis.peaks # the peaks the harmonic analysis kept, same threshold
     
     # Harmonic analysis
-    strong = [p for p in peaks if mag[p] >= threshold * np.max(mag)]
-    strong_sorted = sorted(strong, key=lambda i: freqs[i])
-    strong_sorted = [i for i in strong_sorted if freqs[i] >= fmin]
-    
-    if strong_sorted:
-        max_peak_idx = max(strong_sorted, key=lambda i: mag[i])
-        f0 = freqs[max_peak_idx]
-        tolerance_hz = rate/n_fft
-        
-        groupA, groupB = [], []
-        for idx in strong_sorted:
-            f = freqs[idx]
-            if f < f0 - tolerance_hz:
-                continue
-            k = int(round(f / f0))
-            if k < 1:
-                groupB.append(idx)
-                continue
-            f_ideal = k * f0
-            dev_hz = f - f_ideal
-            if abs(dev_hz) <= tolerance_hz:
-                groupA.append(idx)
-            else:
-                groupB.append(idx)
+    groupA = analysis.groupA["bin"]
+    groupB = analysis.groupB["bin"]
 
     plt.figure(figsize=(10, 4))
     plt.plot(freqs, mag_db, 'b-', linewidth=0.8)
     
-    if strong_sorted:
+    if f0 is not None:
         plt.scatter(freqs[groupA], mag_db[groupA], color='green', s=50, label='Group A (Harmonics)')
         plt.scatter(freqs[groupB], mag_db[groupB], color='red', s=50, label='Group B (Non-harmonic)')
     else:
@@ -90,11 +88,56 @@ def plot_spectrum(filename, file_number, n_fft=16384, fmin=20.0, threshold=0.1):
     plt.grid(True)
     plt.legend()
     plt.xlim(0, 3000)
-    plt.show()
+    _finish(output_file, dpi)
 
 def analyze_file(file_number):
     filename = f"/Users/joshjude/Documents/Git/ttt4295/assignment1/music_box_tones_k/pink-panther_{file_number:03d}.wav"
     plot_waveform(filename, file_number)
     plot_spectrum(filename, file_number)
 
-analyze_file(32)
\ No newline at end of file
+def _use_agg():
+    # worker initializer, no display is needed to render PNGs
+    plt.switch_backend("Agg")
+
+def _render_one(args):
+    filename, output_dir, kwargs = args
+    name = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        plot_waveform(filename, name, output_file=os.path.join(output_dir, f"{name}_waveform.png"),
+                      **{k: v for k, v in kwargs.items() if k in ("n_fft", "offset", "channel", "max_columns", "dpi")})
+        plot_spectrum(filename, name, output_file=os.path.join(output_dir, f"{name}_spectrum.png"),
+                      **{k: v for k, v in kwargs.items() if k in ("n_fft", "fmin", "threshold", "offset", "channel", "dpi")})
+        return filename, None
+    except Exception as e:
+        plt.close('all')
+        return filename, str(e)
+
+def render_directory(files, output_dir="plots", workers=None, **kwargs):
+    # waveform and spectrum PNGs for every file, rendered headless across worker processes
+    if isinstance(files, str):
+        files = glob.glob(files)
+    files = sorted(files)
+    os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    jobs = [(filename, output_dir, kwargs) for filename in files]
+    if workers <= 1:
+        backend = plt.get_backend()
+        _use_agg()
+        try:
+            results = list(map(_render_one, jobs))
+        finally:
+            plt.switch_backend(backend)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_use_agg) as pool:
+            results = list(pool.map(_render_one, jobs))
+
+    for filename, error in results:
+        if error is not None:
+            print(f"Error rendering {filename}: {error}")
+    print(f"Rendered {len(files)} files to: {output_dir}/")
+    return results
+
+if __name__ == "__main__":
+    analyze_file(32)
\ No newline at end of file
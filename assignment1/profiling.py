@@ -0,0 +1,89 @@
+import time
+import numpy as np
+
+STAGES = ("read", "fft", "peaks", "classify", "write")
+COUNTERS = ("samples", "bytes", "peaks_found", "cached")
+
+
+class Profiler:
+    """
+    Per-stage timing and counters for the analysis pipeline.
+
+    The analysis functions take profiler=None and only call add() and
+    count() when a profiler is passed, so a disabled profiler costs one
+    `is not None` test per stage. Values are collected per key (the
+    position of a file in its chunk) and turned into per-file records
+    with finish(), which is what the batch workers send back to the main
+    process to be merged with merge().
+    """
+
+    def __init__(self):
+        self.files = []
+        self._pending = {}
+        self._start = time.perf_counter()
+        self.wall = None
+
+    def add(self, key, stage, seconds):
+        rec = self._pending.setdefault(key, {})
+        rec[stage] = rec.get(stage, 0.0) + seconds
+
+    def count(self, key, name, n):
+        rec = self._pending.setdefault(key, {})
+        rec[name] = rec.get(name, 0) + int(n)
+
+    def finish(self, labels):
+        # attach file labels to the pending values and move them to self.files
+        records = []
+        for key, label in enumerate(labels):
+            rec = self._pending.pop(key, {})
+            rec["file"] = label
+            records.append(rec)
+        self.files.extend(records)
+        return records
+
+    def merge(self, records):
+        self.files.extend(records)
+
+    def record(self, label, stage, seconds):
+        # add time to an already finished file, e.g. the report writing stage
+        for rec in reversed(self.files):
+            if rec["file"] == label:
+                rec[stage] = rec.get(stage, 0.0) + seconds
+                return
+
+    def stop(self):
+        self.wall = time.perf_counter() - self._start
+
+    def summary(self, percentiles=(50, 90, 99)):
+        wall = self.wall if self.wall is not None else time.perf_counter() - self._start
+        n = len(self.files)
+        stages = {}
+        for stage in STAGES:
+            values = np.array([rec.get(stage, 0.0) for rec in self.files])
+            if not n or not values.any():
+                continue
+            stats = {"total": float(values.sum()), "mean": float(values.mean()), "max": float(values.max())}
+            for p, v in zip(percentiles, np.percentile(values, percentiles)):
+                stats[f"p{p}"] = float(v)
+            stages[stage] = stats
+
+        totals = {name: int(sum(rec.get(name, 0) for rec in self.files)) for name in COUNTERS}
+        return {
+            "files": n,
+            "wall_s": wall,
+            "files_per_s": n / wall if wall > 0 else None,
+            "mb_per_s": totals["bytes"] / 1e6 / wall if wall > 0 else None,
+            "stages": stages,
+            "counters": totals,
+        }
+
+    def report(self):
+        s = self.summary()
+        lines = [f"{s['files']} files in {s['wall_s']:.3f} s "
+                 f"({s['files_per_s'] or 0:.1f} files/s, {s['mb_per_s'] or 0:.2f} MB/s read)"]
+        lines.append(f"{'Stage':<10} {'Total [s]':>10} {'Mean [ms]':>10} {'p50 [ms]':>10} {'p90 [ms]':>10} {'p99 [ms]':>10}")
+        for stage, st in s["stages"].items():
+            lines.append(f"{stage:<10} {st['total']:>10.4f} {st['mean']*1e3:>10.3f} {st['p50']*1e3:>10.3f} "
+                         f"{st['p90']*1e3:>10.3f} {st['p99']*1e3:>10.3f}")
+        lines.append(", ".join(f"{name}: {value}" for name, value in s["counters"].items()))
+        return "\n".join(lines)
@@ -0,0 +1,305 @@
+import csv
+import json
+import os
+import tempfile
+import time
+import zipfile
+import numpy as np
+from notes import DEFAULT_TABLE
+
+PARTIAL_COLUMNS = (
+    ("file", np.int64), # position of the file in the run
+    ("k", np.int64),
+    ("frequency", np.float64),
+    ("magnitude", np.float64),
+    ("deviation_hz", np.float64),
+    ("deviation_cents", np.float64),
+    ("level_db_rel_f0", np.float64),
+)
+
+
+class ResultWriter:
+    """
+    Base class for the result writers.
+
+    write() is called once per file as soon as its analysis is done, with
+    the file label, the analyze_harmonics result (None on error) and the
+    error message (None on success). Nothing is kept between calls unless
+    the format needs it, so memory stays flat for any number of files.
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.count = 0
+
+    def write(self, filename, result, error):
+        self.count += 1
+        self._write(filename, result, error)
+
+    def _write(self, filename, result, error):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DetailedReportWriter(ResultWriter):
+    # the hand formatted harmonic analysis report
+
+    def __init__(self, output_file="harmonic_analysis_results.txt", partial_notes=False, table=DEFAULT_TABLE):
+        super().__init__(output_file)
+        self.partial_notes = partial_notes
+        self.table = table
+        self.f = open(output_file, 'w')
+        self.f.write("Harmonic analysis\n")
+        self.f.write("=" * 50 + "\n\n")
+
+    def _write(self, filename, result, error):
+        f = self.f
+        if error is not None:
+            print(f"Error processing {filename}: {error}")
+            f.write(f"ERROR processing file: {error}\n\n")
+            return
+
+        # Write results to file
+        f.write(f"File {self.count}: {os.path.basename(filename)}\n")
+        f.write("-" * 40 + "\n")
+
+        if result["f0"] is None:
+            f.write("No fundamental frequency detected.\n\n")
+            return
+
+        # Get musical note information
+        f0_note = self.table.lookup(result["f0"])
+        note = str(self.table.names(f0_note))
+        theoretical_freq = float(f0_note["theoretical"])
+        cents_dev = float(f0_note["cents"])
+
+        f.write(f"Fundamental frequency (f0): {result['f0']:.3f} Hz\n")
+        f.write(f"Frequency resolution: {result['tolerance_hz']:.3f} Hz\n")
+        f.write(f"Tolerance: ±{result['tolerance_hz']:.3f} Hz\n")
+
+        if note:
+            f.write(f"Musical note: {note}\n")
+            f.write(f"Theoretical frequency: {theoretical_freq:.3f} Hz\n")
+            f.write(f"Deviation from equal temperament: {cents_dev:+.2f} cents\n")
+
+        f.write(f"\nGroup A (Harmonics): {len(result['groupA'])} peaks\n")
+        if self.partial_notes:
+            partials = np.array([p["frequency"] for p in result["groupA"]], dtype=np.float64)
+            notes = self.table.lookup(partials)
+            labels = self.table.names(notes)
+            f.write("k   Frequency [Hz]   Dev [Hz]   Dev [cents]   Level [dB]   Note   ET dev [cents]\n")
+            for p, label, et_cents in zip(result["groupA"], labels, notes["cents"]):
+                f.write(f"{p['k']:>2d}  {p['frequency']:>11.3f}   {p['deviation_hz']:>+8.3f}   {p['deviation_cents']:>+8.2f}   {p['level_db_rel_f0']:>+8.2f}   {label:<5}  {et_cents:>+8.2f}\n")
+        else:
+            f.write("k   Frequency [Hz]   Dev [Hz]   Dev [cents]   Level [dB]\n")
+            for p in result["groupA"]:
+                f.write(f"{p['k']:>2d}  {p['frequency']:>11.3f}   {p['deviation_hz']:>+8.3f}   {p['deviation_cents']:>+8.2f}   {p['level_db_rel_f0']:>+8.2f}\n")
+
+        if len(result["groupB"]):
+            f.write(f"\nGroup B (Non-harmonic): {len(result['groupB'])} peaks\n")
+            f.write("Frequencies [Hz]: ")
+            f.write(", ".join(f"{p['frequency']:.2f}" for p in result["groupB"]))
+            f.write("\n")
+
+        f.write("\n" + "="*50 + "\n\n")
+
+    def close(self):
+        self.f.close()
+        print(f"Results written to: {self.output_file}")
+
+
+class SummaryTableWriter(ResultWriter):
+    # one line per file with f0 and the nearest note
+
+    def __init__(self, output_file="summary_table.txt", table=DEFAULT_TABLE):
+        super().__init__(output_file)
+        self.table = table
+        self.f = open(output_file, 'w')
+        self.f.write("Fundamental frequencies and musical notes\n")
+        self.f.write("=" * 80 + "\n\n")
+        self.f.write(f"{'File':<30} {'f0 [Hz]':<10} {'Note':<6} {'Theoretical [Hz]':<15} {'Deviation [cents]':<15}\n")
+        self.f.write("-" * 80 + "\n")
+
+    def _write(self, filename, result, error):
+        f = self.f
+        if error is not None:
+            f.write(f"{os.path.basename(filename):<30} ERROR: {error}\n")
+            return
+
+        if result["f0"] is None:
+            f.write(f"{os.path.basename(filename):<30} {'N/A':<10} {'N/A':<6} {'N/A':<15} {'N/A':<15}\n")
+            return
+
+        notes = self.table.lookup(result["f0"])
+        note = str(self.table.names(notes))
+        f.write(f"{os.path.basename(filename):<30} {result['f0']:<10.3f} {note or 'N/A':<6} ")
+        f.write(f"{float(notes['theoretical']):<15.3f} {float(notes['cents']):<+15.2f}\n")
+
+    def close(self):
+        self.f.close()
+        print(f"Summary table written to: {self.output_file}")
+
+
+def _plain(value):
+    # numpy scalars to python numbers for json/csv
+    return value.item() if isinstance(value, np.generic) else value
+
+def _partials(group):
+    names = [name for name in group.dtype.names if name != "bin"] if isinstance(group, np.ndarray) else None
+    if names is not None:
+        return [dict(zip(names, row)) for row in zip(*(group[n].tolist() for n in names))]
+    return [{key: _plain(v) for key, v in p.items()} for p in group]
+
+def result_record(filename, result, error, table=DEFAULT_TABLE):
+    # flat description of one file, shared by the structured writers
+    record = {"file": filename, "error": error, "f0": None, "note": None, "theoretical": None, "cents": None,
+              "tolerance_hz": None, "n_groupA": 0, "n_groupB": 0}
+    if error is not None or result["f0"] is None:
+        return record
+
+    notes = table.lookup(result["f0"])
+    record.update({
+        "f0": float(result["f0"]),
+        "note": str(table.names(notes)),
+        "theoretical": float(notes["theoretical"]),
+        "cents": float(notes["cents"]),
+        "tolerance_hz": float(result["tolerance_hz"]),
+        "n_groupA": len(result["groupA"]),
+        "n_groupB": len(result["groupB"]),
+    })
+    return record
+
+
+class JSONLinesWriter(ResultWriter):
+    # one JSON object per file including both peak groups, flushed per line
+
+    def __init__(self, output_file="harmonic_analysis.jsonl", table=DEFAULT_TABLE):
+        super().__init__(output_file)
+        self.table = table
+        self.f = open(output_file, 'w')
+
+    def _write(self, filename, result, error):
+        record = result_record(filename, result, error, self.table)
+        if record["f0"] is not None:
+            record["groupA"] = _partials(result["groupA"])
+            record["groupB"] = _partials(result["groupB"])
+        self.f.write(json.dumps(record) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+        print(f"JSON Lines written to: {self.output_file}")
+
+
+class CSVWriter(ResultWriter):
+    # the summary fields, one row per file
+
+    FIELDS = ("file", "f0", "note", "theoretical", "cents", "tolerance_hz", "n_groupA", "n_groupB", "error")
+
+    def __init__(self, output_file="harmonic_analysis.csv", table=DEFAULT_TABLE):
+        super().__init__(output_file)
+        self.table = table
+        self.f = open(output_file, 'w', newline='')
+        self.csv = csv.DictWriter(self.f, fieldnames=self.FIELDS)
+        self.csv.writeheader()
+
+    def _write(self, filename, result, error):
+        self.csv.writerow(result_record(filename, result, error, self.table))
+
+    def close(self):
+        self.f.close()
+        print(f"CSV written to: {self.output_file}")
+
+
+class NPZPartialsWriter(ResultWriter):
+    """
+    Columnar archive of every group A partial.
+
+    Each column of PARTIAL_COLUMNS is appended to its own temporary file
+    as results arrive, and close() assembles them into an .npz (one .npy
+    per column, plus f0 per file and the file names) without loading the
+    columns back into memory.
+    """
+
+    def __init__(self, output_file="harmonic_partials.npz"):
+        super().__init__(output_file)
+        self._tmp = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file)))
+        self._columns = {name: open(os.path.join(self._tmp.name, name), 'wb') for name, _ in PARTIAL_COLUMNS + (("f0", None),)}
+        self._names = []
+        self._rows = 0
+
+    def _write(self, filename, result, error):
+        i = self.count - 1
+        self._names.append(os.path.basename(filename))
+        f0 = np.nan if error is not None or result["f0"] is None else result["f0"]
+        self._columns["f0"].write(np.float64(f0).tobytes())
+        if error is not None or result["f0"] is None:
+            return
+
+        groupA = result["groupA"]
+        n = len(groupA)
+        for name, dtype in PARTIAL_COLUMNS:
+            if name == "file":
+                values = np.full(n, i, dtype=dtype)
+            elif isinstance(groupA, np.ndarray):
+                values = groupA[name].astype(dtype)
+            else:
+                values = np.array([p[name] for p in groupA], dtype=dtype)
+            self._columns[name].write(values.tobytes())
+        self._rows += n
+
+    def _copy_column(self, zf, name, dtype, length):
+        path = os.path.join(self._tmp.name, name)
+        with zf.open(name + ".npy", 'w', force_zip64=True) as out, open(path, 'rb') as src:
+            np.lib.format.write_array_header_1_0(out, {"descr": np.dtype(dtype).str, "fortran_order": False,
+                                                       "shape": (length,)})
+            for block in iter(lambda: src.read(1 << 20), b''):
+                out.write(block)
+
+    def close(self):
+        for f in self._columns.values():
+            f.close()
+        with zipfile.ZipFile(self.output_file, 'w', zipfile.ZIP_STORED) as zf:
+            for name, dtype in PARTIAL_COLUMNS:
+                self._copy_column(zf, name, dtype, self._rows)
+            self._copy_column(zf, "f0", np.float64, self.count)
+            with zf.open("files.npy", 'w') as out:
+                np.lib.format.write_array(out, np.array(self._names))
+        self._tmp.cleanup()
+        print(f"Partials archive written to: {self.output_file}")
+
+
+WRITERS = {
+    ".txt": DetailedReportWriter,
+    ".jsonl": JSONLinesWriter,
+    ".csv": CSVWriter,
+    ".npz": NPZPartialsWriter,
+}
+
+def writer_for(output_file):
+    # picks the writer from the file extension
+    ext = os.path.splitext(output_file)[1].lower()
+    if ext not in WRITERS:
+        raise ValueError(f"No result writer for '{ext}' files, use one of {', '.join(WRITERS)}")
+    return WRITERS[ext](output_file)
+
+def write_results(results, writers, profiler=None):
+    # feeds every (filename, result, error) to all writers as it arrives
+    try:
+        for filename, result, error in results:
+            t = time.perf_counter() if profiler is not None else 0.0
+            for writer in writers:
+                writer.write(filename, result, error)
+            if profiler is not None:
+                profiler.record(filename, "write", time.perf_counter() - t)
+    finally:
+        for writer in writers:
+            writer.close()
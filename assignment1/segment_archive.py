@@ -0,0 +1,118 @@
+import glob
+import json
+import os
+import numpy as np
+from spectrum import _read_mapped
+
+SAMPLES_FILE = "samples.bin"
+INDEX_FILE = "index.json"
+
+
+class ArchiveWriter:
+    """
+    Appends mono segments to a segment archive.
+
+    An archive is a directory with all samples stored back to back in
+    samples.bin and an index.json holding the name, offset, length and
+    rate of every segment. Segments are written as they are added, so the
+    writer never holds more than one segment in memory. All segments
+    share one dtype, the given one or that of the first segment; a
+    segment that cannot be cast to it without loss raises ValueError.
+    """
+
+    def __init__(self, archive_dir, dtype=None):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.archive_dir = archive_dir
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self.index = {"dtype": None, "names": [], "offset": [], "length": [], "rate": []}
+        self._samples = open(os.path.join(archive_dir, SAMPLES_FILE), 'wb')
+        self._offset = 0
+
+    def add(self, name, rate, samples):
+        if self.dtype is None:
+            self.dtype = samples.dtype
+        elif not np.can_cast(samples.dtype, self.dtype, "safe"):
+            # one dtype is shared by the whole store, never wrap or truncate samples into it
+            raise ValueError(f"Segment '{name}' has dtype {samples.dtype}, which does not fit the archive dtype "
+                             f"{self.dtype}, pass a wider dtype to ArchiveWriter")
+        samples = np.ascontiguousarray(samples, dtype=self.dtype)
+        self._samples.write(samples.tobytes())
+
+        self.index["names"].append(name)
+        self.index["offset"].append(self._offset)
+        self.index["length"].append(len(samples))
+        self.index["rate"].append(int(rate))
+        self._offset += len(samples)
+
+    def close(self):
+        self._samples.close()
+        self.index["dtype"] = (self.dtype or np.dtype(np.int16)).str
+        with open(os.path.join(self.archive_dir, INDEX_FILE), 'w') as f:
+            json.dump(self.index, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SegmentArchive:
+    """
+    Read side of a segment archive.
+
+    The sample store is memory mapped, segment(i) returns (rate, view)
+    where view is a zero-copy slice of the store. Segments can be looked
+    up by position or by name in constant time.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        with open(os.path.join(archive_dir, INDEX_FILE)) as f:
+            index = json.load(f)
+        self.names = index["names"]
+        self.offset = np.asarray(index["offset"], dtype=np.int64)
+        self.length = np.asarray(index["length"], dtype=np.int64)
+        self.rate = np.asarray(index["rate"], dtype=np.int64)
+        self._positions = {name: i for i, name in enumerate(self.names)}
+
+        path = os.path.join(archive_dir, SAMPLES_FILE)
+        if os.path.getsize(path):
+            self.samples = np.memmap(path, dtype=np.dtype(index["dtype"]), mode='r')
+        else:
+            self.samples = np.zeros(0, dtype=np.dtype(index["dtype"]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, key):
+        return self._positions[key] if isinstance(key, str) else int(key)
+
+    def segment(self, key):
+        i = self.position(key)
+        start = self.offset[i]
+        return int(self.rate[i]), self.samples[start:start + self.length[i]]
+
+    def __getitem__(self, key):
+        return self.segment(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.names[i], self.segment(i)
+
+
+def wavs_to_archive(files, archive_dir, channel=0, dtype=None):
+    # converts a glob pattern or list of WAV files, in sorted order
+    if isinstance(files, str):
+        files = glob.glob(files)
+    files = sorted(files)
+
+    with ArchiveWriter(archive_dir, dtype) as writer:
+        for filename in files:
+            rate, data = _read_mapped(filename)
+            if data.ndim > 1:
+                data = data[:, channel]
+            writer.add(os.path.basename(filename), rate, data)
+
+    print(f"Archived {len(files)} files to: {archive_dir}/")
+    return SegmentArchive(archive_dir)
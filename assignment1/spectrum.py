@@ -0,0 +1,251 @@
+import time
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import find_peaks, get_window
+from functools import lru_cache
+
+
+@lru_cache(maxsize=32)
+def rfft_freqs(rate, n_fft):
+    # frequency axis of the positive half spectrum, shared between calls
+    freqs = np.fft.rfftfreq(n_fft, 1/rate)[:n_fft // 2]
+    freqs.flags.writeable = False
+    return freqs
+
+def _read_mapped(filename):
+    try:
+        rate, data = wavfile.read(filename, mmap=True)
+    except ValueError:
+        # 24-bit and a few other formats cannot be memory mapped
+        rate, data = wavfile.read(filename)
+    return rate, data
+
+def read_window(filename, length, offset=0, channel=0):
+    # memory maps the file so only the samples inside the window are read
+    if isinstance(filename, tuple):
+        # (rate, samples) pair, e.g. a segment view from a SegmentArchive
+        rate, data = filename
+    else:
+        rate, data = _read_mapped(filename)
+    if data.ndim > 1:
+        data = data[:, channel] # strided view, the other channels are not copied
+    return rate, np.array(data[offset:offset + length])
+
+def wav_blocks(filename, block_size=65536, channel=0):
+    """
+    Streams one channel of a WAV file as float64 blocks of block_size
+    samples (the last one may be shorter). Returns the sample rate and the
+    block generator. The file is memory mapped, so only one block is held
+    in memory at a time.
+    """
+    rate, data = _read_mapped(filename)
+    if data.ndim > 1:
+        data = data[:, channel]
+
+    def blocks():
+        for start in range(0, len(data), block_size):
+            yield np.asarray(data[start:start + block_size], dtype=np.float64)
+
+    return rate, blocks()
+
+def batch_spectra(files, n_fft=65536, chunk_size=32, offset=0, channel=0, window=None, profiler=None):
+    """
+    Magnitude spectra of many files computed with one rfft per chunk.
+
+    The window of n_fft samples starting at sample offset is read from
+    each file, zero padded if the file is shorter, and stacked into a
+    (chunk_size, n_fft) matrix, so at most chunk_size windows are held in
+    memory at once. If window is given (any scipy.signal.get_window name)
+    the windows are tapered before the transform.
+
+    files may also hold (rate, samples) pairs instead of paths.
+
+    Yields (filename, rate, freqs, mag, error) in input order. A file that
+    cannot be read has rate, freqs and mag set to None and the exception
+    in error.
+
+    With a profiling.Profiler, read time, samples and bytes are recorded
+    per file and the FFT time of a chunk is split evenly over its files,
+    all keyed by the position of the file in files.
+    """
+    files = list(files)
+    for start in range(0, len(files), chunk_size):
+        chunk = files[start:start + chunk_size]
+        X = np.zeros((len(chunk), n_fft))
+        rates = [None] * len(chunk)
+        errors = [None] * len(chunk)
+
+        for i, filename in enumerate(chunk):
+            t = time.perf_counter() if profiler is not None else 0.0
+            try:
+                rates[i], x = read_window(filename, n_fft, offset, channel)
+                X[i, :len(x)] = x
+            except Exception as e:
+                errors[i] = e
+            if profiler is not None:
+                profiler.add(start + i, "read", time.perf_counter() - t)
+                if errors[i] is None:
+                    profiler.count(start + i, "samples", len(x))
+                    profiler.count(start + i, "bytes", x.nbytes)
+
+        t = time.perf_counter() if profiler is not None else 0.0
+        if window is not None:
+            X *= get_window(window, n_fft)
+        mag = np.abs(np.fft.rfft(X, axis=1)[:, :n_fft // 2])
+        del X
+        if profiler is not None:
+            dt = (time.perf_counter() - t) / len(chunk)
+            for i in range(len(chunk)):
+                profiler.add(start + i, "fft", dt)
+
+        for i, filename in enumerate(chunk):
+            if errors[i] is not None:
+                yield filename, None, None, None, errors[i]
+            else:
+                yield filename, rates[i], rfft_freqs(rates[i], n_fft), mag[i], None
+
+def spectrum(filename, n_fft=65536, offset=0, channel=0, window=None, profiler=None):
+    # single file wrapper, returns rate, freqs and magnitude
+    _, rate, freqs, mag, error = next(batch_spectra([filename], n_fft, 1, offset, channel, window, profiler))
+    if error is not None:
+        raise error
+    return rate, freqs, mag
+
+GROUP_A_DTYPE = np.dtype([
+    ("bin", np.int64),
+    ("k", np.int64),
+    ("frequency", np.float64),
+    ("magnitude", np.float64),
+    ("deviation_hz", np.float64),
+    ("deviation_cents", np.float64),
+    ("level_db_rel_f0", np.float64),
+])
+GROUP_B_DTYPE = np.dtype([
+    ("bin", np.int64),
+    ("frequency", np.float64),
+    ("magnitude", np.float64),
+])
+
+def refine_peaks(freqs, mag, bins, method="log"):
+    """
+    Sub-bin frequency and level of spectral peaks.
+
+    A parabola is fitted through each peak bin and its two neighbours,
+    on the log magnitude for method="log" (exact for a Gaussian shaped
+    peak and close for a Hann window) or on the linear magnitude for
+    method="quadratic". Returns the refined frequencies and magnitudes.
+    """
+    bins = np.asarray(bins)
+    if method == "log":
+        a, b, c = (np.log(mag[bins + i] + 1e-300) for i in (-1, 0, 1))
+    elif method == "quadratic":
+        a, b, c = (mag[bins + i] for i in (-1, 0, 1))
+    else:
+        raise ValueError(f"Unknown refinement method: {method}")
+
+    denom = a - 2 * b + c
+    p = np.where(denom < 0, 0.5 * (a - c) / np.where(denom < 0, denom, 1), 0.0)
+    peak = b - 0.25 * (a - c) * p
+    if method == "log":
+        peak = np.exp(peak)
+
+    df = freqs[1] - freqs[0]
+    return freqs[bins] + p * df, peak
+
+def classify_peaks(freqs, mag, tolerance_hz, threshold=0.1, fmin=20.0, refine=None, tolerance_cents=None,
+                   profiler=None, key=0, return_peaks=False):
+    """
+    Split the spectral peaks into harmonics (group A) and non-harmonic
+    peaks (group B).
+
+    Peaks weaker than threshold times the strongest peak or below fmin are
+    dropped. The strongest remaining peak is taken as f0, and a peak is a
+    harmonic when it lies within tolerance_hz of k * f0.
+
+    With refine set to a refine_peaks method the peak frequencies and
+    magnitudes are interpolated between bins. tolerance_cents, if given,
+    replaces tolerance_hz by a limit on the deviation from k * f0 in
+    cents, so the test follows the refined f0 rather than the bin width.
+
+    Returns f0 and two structured arrays with GROUP_A_DTYPE and
+    GROUP_B_DTYPE. Group A is sorted by k, group B by frequency. f0 is
+    None when no peak survives. With return_peaks the bins of every peak
+    that passed threshold and fmin are returned as well.
+    """
+    if profiler is None:
+        peaks, _ = find_peaks(mag) # finding the local maxima
+        out = _split_peaks(freqs, mag, peaks, tolerance_hz, threshold, fmin, refine, tolerance_cents)
+    else:
+        t = time.perf_counter()
+        peaks, _ = find_peaks(mag)
+        t_peaks = time.perf_counter()
+        out = _split_peaks(freqs, mag, peaks, tolerance_hz, threshold, fmin, refine, tolerance_cents)
+        profiler.add(key, "peaks", t_peaks - t)
+        profiler.add(key, "classify", time.perf_counter() - t_peaks)
+        profiler.count(key, "peaks_found", len(peaks))
+    if return_peaks:
+        return out + (_kept_peaks(freqs, mag, peaks, threshold, fmin),)
+    return out
+
+def _kept_peaks(freqs, mag, peaks, threshold, fmin):
+    # peaks at least threshold times the strongest one and not below fmin, in increasing frequency
+    if len(peaks) == 0:
+        return peaks
+    peak_mag = mag[peaks]
+    return peaks[(peak_mag >= threshold * peak_mag.max()) & (freqs[peaks] >= fmin)]
+
+def _split_peaks(freqs, mag, peaks, tolerance_hz, threshold, fmin, refine, tolerance_cents):
+    if len(peaks) == 0:
+        return None, np.zeros(0, GROUP_A_DTYPE), np.zeros(0, GROUP_B_DTYPE)
+
+    idx = _kept_peaks(freqs, mag, peaks, threshold, fmin) # find_peaks returns bins in increasing frequency
+    if len(idx) == 0:
+        return None, np.zeros(0, GROUP_A_DTYPE), np.zeros(0, GROUP_B_DTYPE)
+
+    if refine is not None:
+        f, m = refine_peaks(freqs, mag, idx, refine)
+    else:
+        f = freqs[idx]
+        m = mag[idx]
+    i0 = np.argmax(m)
+    f0 = f[i0] # fundamental frequency is the largest magnitude peak
+    mag0 = m[i0]
+
+    if tolerance_cents is not None:
+        above = f >= f0 * 2 ** (-tolerance_cents / 1200)
+    else:
+        above = f >= f0 - tolerance_hz # skipping peaks below the fundamental
+    idx, f, m = idx[above], f[above], m[above]
+
+    k = np.rint(f / f0).astype(np.int64) # harmonic number
+    f_ideal = k * f0
+    dev_hz = f - f_ideal
+    if tolerance_cents is not None:
+        dev_cents = 1200.0 * np.log2(f / np.where(k >= 1, f_ideal, f))
+        harmonic = (k >= 1) & (np.abs(dev_cents) <= tolerance_cents)
+    else:
+        harmonic = (k >= 1) & (np.abs(dev_hz) <= tolerance_hz)
+
+    order = np.argsort(k[harmonic], kind="stable")
+    groupA = np.empty(order.size, GROUP_A_DTYPE)
+    groupA["bin"] = idx[harmonic][order]
+    groupA["k"] = k[harmonic][order]
+    groupA["frequency"] = f[harmonic][order]
+    groupA["magnitude"] = m[harmonic][order]
+    groupA["deviation_hz"] = dev_hz[harmonic][order]
+    groupA["deviation_cents"] = 1200.0 * np.log2(groupA["frequency"] / f_ideal[harmonic][order])
+    groupA["level_db_rel_f0"] = 20.0 * np.log10(groupA["magnitude"] / mag0)
+
+    other = ~harmonic
+    groupB = np.empty(np.count_nonzero(other), GROUP_B_DTYPE)
+    groupB["bin"] = idx[other]
+    groupB["frequency"] = f[other]
+    groupB["magnitude"] = m[other]
+
+    return f0, groupA, groupB
+
+def records_to_dicts(records):
+    # structured array -> list of dicts, without the internal bin index
+    names = [name for name in records.dtype.names if name != "bin"]
+    columns = [records[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
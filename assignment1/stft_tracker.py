@@ -0,0 +1,145 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import get_window
+from spectrum import classify_peaks, spectrum, wav_blocks
+
+TRACK_DTYPE = np.dtype([
+    ("k", np.int64),
+    ("frequency", np.float64),
+    ("decay_db_per_s", np.float64),
+    ("drift_cents_per_s", np.float64),
+    ("mean_cents", np.float64),
+    ("frames", np.int64),
+])
+
+
+def stft_blocks(blocks, n_fft=4096, hop=1024, window="hann"):
+    """
+    Short-time magnitude spectra of a stream of sample blocks.
+
+    Samples are collected in a reused buffer and every complete frame in
+    it is windowed into a reused frame matrix and transformed with one
+    rfft call. Only the last n_fft - hop samples are carried over between
+    blocks, so memory does not depend on the length of the stream.
+
+    Yields (starts, mag) where starts holds the first sample index of each
+    frame and mag is an (frames, n_fft // 2 + 1) magnitude matrix.
+    """
+    win = get_window(window, n_fft)
+    buf = np.empty(0)
+    frames = np.empty((0, n_fft))
+    carry = 0 # samples kept from the previous block
+    pos = 0 # stream index of buf[0]
+
+    for block in blocks:
+        need = carry + len(block)
+        if need > len(buf):
+            grown = np.empty(need)
+            grown[:carry] = buf[:carry]
+            buf = grown
+        buf[carry:need] = block
+
+        n_frames = (need - n_fft) // hop + 1 if need >= n_fft else 0
+        if n_frames > 0:
+            if len(frames) < n_frames:
+                frames = np.empty((n_frames, n_fft))
+            out = frames[:n_frames]
+            np.multiply(sliding_window_view(buf[:need], n_fft)[::hop][:n_frames], win, out=out)
+            yield pos + hop * np.arange(n_frames), np.abs(np.fft.rfft(out, axis=1))
+
+        consumed = n_frames * hop
+        carry = need - consumed
+        buf[:carry] = buf[consumed:need]
+        pos += consumed
+
+def _partial_search_bins(partials, rate, n_fft, search_cents):
+    # fixed width bin neighbourhood around every partial, one row per partial
+    centers = np.rint(partials * n_fft / rate).astype(np.int64)
+    width = partials * (2 ** (search_cents / 1200) - 1) * n_fft / rate
+    half = max(2, int(np.ceil(width.max()))) if len(partials) else 2
+    bins = centers[:, None] + np.arange(-half, half + 1)
+    return np.clip(bins, 1, n_fft // 2 - 1)
+
+def track_frames(filename, partials, n_fft=4096, hop=1024, block_size=65536, window="hann",
+                 search_cents=50.0, channel=0):
+    """
+    Follows a set of partial frequencies through the whole recording.
+
+    In every STFT frame the strongest bin within search_cents of each
+    partial is located and refined by parabolic interpolation of the dB
+    magnitude. Yields (times, freqs, levels_db) per block, each of shape
+    (frames, partials), with times in seconds at the frame centres.
+    """
+    rate, blocks = wav_blocks(filename, block_size, channel)
+    partials = np.asarray(partials, dtype=np.float64)
+    bins = _partial_search_bins(partials, rate, n_fft, search_cents)
+
+    for starts, mag in stft_blocks(blocks, n_fft, hop, window):
+        mag_db = 20 * np.log10(mag + 1e-12)
+        rows = np.arange(len(mag_db))[:, None]
+        best = np.argmax(mag_db[:, bins], axis=2) # (frames, partials, search bins)
+        b = bins[np.arange(len(bins)), best]
+
+        y0, y1, y2 = mag_db[rows, b - 1], mag_db[rows, b], mag_db[rows, b + 1]
+        denom = y0 - 2 * y1 + y2
+        delta = np.where(denom < 0, 0.5 * (y0 - y2) / np.where(denom < 0, denom, 1), 0.0)
+        delta = np.clip(delta, -0.5, 0.5) # edge of the search range is not a true maximum
+
+        times = (starts + n_fft / 2) / rate
+        freqs = (b + delta) * rate / n_fft
+        levels = y1 - 0.25 * (y0 - y2) * delta
+        yield np.broadcast_to(times[:, None], freqs.shape), freqs, levels
+
+def track_partials(filename, threshold=0.1, fmin=20.0, ref_n_fft=65536, n_fft=4096, hop=1024,
+                   block_size=65536, window="hann", search_cents=50.0, dynamic_range_db=60.0, channel=0):
+    """
+    Decay rate and frequency drift of every group A partial of a file.
+
+    The partials are found with the same peak classification as
+    analyze_harmonics on the first ref_n_fft samples, then followed with
+    track_frames. Decay (dB/s) and drift (cents/s) are least squares
+    slopes over the frames where a partial is within dynamic_range_db of
+    its loudest level so far. Only running sums are kept, so memory stays
+    constant for any file length.
+
+    Returns f0 and a structured array with TRACK_DTYPE, one row per
+    partial.
+    """
+    rate, freqs, mag = spectrum(filename, ref_n_fft, 0, channel)
+    f0, groupA, _ = classify_peaks(freqs, mag, rate/ref_n_fft, threshold, fmin)
+    partials = groupA["frequency"]
+
+    P = len(partials)
+    peak_db = np.full(P, -np.inf)
+    n, st, stt = np.zeros(P), np.zeros(P), np.zeros(P)
+    sl, stl, sc, stc = np.zeros(P), np.zeros(P), np.zeros(P), np.zeros(P)
+
+    if P:
+        for times, freqs_t, levels in track_frames(filename, partials, n_fft, hop, block_size, window,
+                                                   search_cents, channel):
+            running = np.maximum(np.maximum.accumulate(levels, axis=0), peak_db)
+            peak_db = running[-1]
+            used = levels >= running - dynamic_range_db
+            cents = 1200 * np.log2(freqs_t / partials)
+
+            t = np.where(used, times, 0.0)
+            n += used.sum(axis=0)
+            st += t.sum(axis=0)
+            stt += (t * t).sum(axis=0)
+            sl += np.where(used, levels, 0.0).sum(axis=0)
+            stl += (t * np.where(used, levels, 0.0)).sum(axis=0)
+            sc += np.where(used, cents, 0.0).sum(axis=0)
+            stc += (t * np.where(used, cents, 0.0)).sum(axis=0)
+
+    var = n * stt - st * st
+    ok = (n >= 2) & (var > 0)
+    var = np.where(ok, var, 1.0)
+
+    tracks = np.zeros(P, TRACK_DTYPE)
+    tracks["k"] = groupA["k"]
+    tracks["frequency"] = partials
+    tracks["decay_db_per_s"] = np.where(ok, (n * stl - st * sl) / var, np.nan)
+    tracks["drift_cents_per_s"] = np.where(ok, (n * stc - st * sc) / var, np.nan)
+    tracks["mean_cents"] = np.where(n > 0, sc / np.maximum(n, 1), np.nan)
+    tracks["frames"] = n
+    return f0, tracks
@@ -1,8 +1,12 @@
 import numpy as np
 from scipy.io import wavfile
+from scipy.ndimage import maximum_filter1d, median_filter
 import os
+from segment_archive import ArchiveWriter
+from spectrum import _read_mapped, wav_blocks
+from stft_tracker import stft_blocks
 
-def split_audio_file(input_filename, time_splits, output_dir="split_audio"):
+def split_audio_file(input_filename, time_splits, output_dir="split_audio", archive=False):
     """
     Split an audio file into multiple segments based on time intervals.
     
@@ -10,14 +14,15 @@ def split_audio_file(input_filename, time_splits, output_dir="split_audio"):
     input_filename (str): Path to the input audio file
     time_splits (list): List of [start_time, end_time] pairs in seconds
     output_dir (str): Directory to save the split files
+    archive (bool): Write a single SegmentArchive to output_dir instead of one WAV per segment
     """
     
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
-    # Read the audio file
-    rate, data = wavfile.read(input_filename)
+    # Memory map the audio file, only the segments are read from disk
+    rate, data = _read_mapped(input_filename)
     
     # Handle stereo files by taking first channel
     if data.ndim > 1:
@@ -31,6 +36,8 @@ def split_audio_file(input_filename, time_splits, output_dir="split_audio"):
     print(f"Duration: {len(data)/rate:.2f} seconds")
     print(f"Splitting into {len(time_splits)} segments...")
     
+    writer = ArchiveWriter(output_dir, data.dtype) if archive else None
+    
     for i, (start_time, end_time) in enumerate(time_splits):
         # Convert time to sample indices
         start_sample = int(start_time * rate)
@@ -47,13 +54,137 @@ def split_audio_file(input_filename, time_splits, output_dir="split_audio"):
         output_filename = os.path.join(output_dir, f"{base_name}_{i+1:03d}.wav")
         
         # Save the segment
-        wavfile.write(output_filename, rate, segment.astype(data.dtype))
+        if writer is not None:
+            writer.add(os.path.basename(output_filename), rate, segment)
+        else:
+            wavfile.write(output_filename, rate, segment.astype(data.dtype))
         
         duration = (end_sample - start_sample) / rate
         print(f"Segment {i+1:2d}: {start_time:6.2f}s - {end_time:6.2f}s ({duration:5.2f}s) -> {os.path.basename(output_filename)}")
     
+    if writer is not None:
+        writer.close()
     print(f"\nAll segments saved to: {output_dir}/")
 
+def _novelty(mag, prev, method):
+    # positive change between consecutive frames, prev is the last frame of the previous block
+    if method == "energy":
+        level = np.log1p(np.sum(mag * mag, axis=1))
+        diff = np.diff(level, prepend=level[0] if prev is None else prev)
+        return np.maximum(diff, 0.0), level[-1]
+    if method == "flux":
+        logmag = np.log1p(100 * mag)
+        diff = np.diff(logmag, axis=0, prepend=(logmag[:1] if prev is None else prev[None, :]))
+        return np.maximum(diff, 0.0).sum(axis=1), logmag[-1]
+    raise ValueError(f"Unknown novelty method: {method}")
+
+def detect_onsets(input_filename, threshold=1.0, min_segment=0.25, method="flux", n_fft=2048, hop=512,
+                  peak_window=0.05, median_window=0.5, block_size=1 << 18, channel=0):
+    """
+    Find note onsets by streaming through an audio file.
+
+    Parameters:
+    input_filename (str): Path to the input audio file
+    threshold (float): Sensitivity, lower values give more onsets. A frame is an onset when its
+        novelty is a local maximum and exceeds the local median by threshold times the running
+        mean novelty of the file so far
+    min_segment (float): Minimum time between two onsets in seconds
+    method (str): "flux" for spectral flux or "energy" for log energy novelty
+    peak_window, median_window (float): Half widths in seconds of the local maximum and median windows
+
+    Returns the onset times in seconds and the file duration.
+    """
+    rate, blocks = wav_blocks(input_filename, block_size, channel)
+    n_samples = 0
+
+    def counted(blocks):
+        # the real file length, the STFT frames stop up to a hop (or a whole n_fft) short of it
+        nonlocal n_samples
+        for block in blocks:
+            n_samples += len(block)
+            yield block
+
+    frame_time = hop / rate
+    w_peak = max(1, int(round(peak_window / frame_time)))
+    w_med = max(1, int(round(median_window / frame_time)))
+    W = max(w_peak, w_med)
+    min_gap = int(np.ceil(min_segment / frame_time))
+
+    onsets = []
+    last_onset = -min_gap
+    prev = None
+    total, count = 0.0, 0
+    ctx = np.empty(0) # novelty frames kept for the context windows
+    ctx_start = 0 # frame index of ctx[0]
+
+    def decide(ctx, ctx_start, lo, hi):
+        nonlocal last_onset
+        local_max = maximum_filter1d(ctx, 2 * w_peak + 1, mode="nearest") == ctx
+        med = median_filter(ctx, 2 * w_med + 1, mode="nearest")
+        delta = threshold * (total / max(count, 1))
+        for i in np.flatnonzero(local_max[lo:hi] & (ctx[lo:hi] > med[lo:hi] + delta)) + lo:
+            frame = ctx_start + i
+            if frame - last_onset >= min_gap:
+                onsets.append((frame * hop + n_fft / 2) / rate)
+                last_onset = frame
+
+    for starts, mag in stft_blocks(counted(blocks), n_fft, hop, window="hann"):
+        flux, prev = _novelty(mag, prev, method)
+        total += flux.sum()
+        count += len(flux)
+        ctx = np.concatenate((ctx, flux))
+
+        # frames with W frames of context on both sides can be decided now
+        if len(ctx) > 2 * W:
+            decide(ctx, ctx_start, W if ctx_start else 0, len(ctx) - W)
+            keep = 2 * W
+            ctx_start += len(ctx) - keep
+            ctx = ctx[-keep:]
+
+    if len(ctx):
+        decide(ctx, ctx_start, W if ctx_start else 0, len(ctx))
+
+    return onsets, n_samples / rate
+
+def onsets_to_time_splits(onsets, duration, min_segment=0.25):
+    # consecutive onsets become [start, end] pairs, the last segment runs to the end of the file.
+    # The first frame cannot be an onset (its novelty is taken against itself), so the table
+    # starts at 0 unless the first onset is already within min_segment of the start
+    bounds = list(onsets) + [duration]
+    if not len(onsets) or bounds[0] >= min_segment:
+        bounds.insert(0, 0.0)
+    return [[round(start, 2), round(end, 2)] for start, end in zip(bounds[:-1], bounds[1:])]
+
+def format_time_splits(time_splits):
+    # same layout as the hand written table below, for review or pasting back in
+    lines = ["time_splits = ["]
+    lines += [f"    [{start:.2f}, {end:.2f}]," for start, end in time_splits]
+    lines.append("]")
+    return "\n".join(lines) + "\n"
+
+def auto_split_audio_file(input_filename, output_dir="split_audio", review_file=None, **kwargs):
+    """
+    Detect onsets with detect_onsets and split the file at them.
+
+    Parameters:
+    input_filename (str): Path to the input audio file
+    output_dir (str): Directory to save the split files
+    review_file (str): If given, the detected table is written here
+    **kwargs: Passed on to detect_onsets
+
+    Returns the detected time splits.
+    """
+    onsets, duration = detect_onsets(input_filename, **kwargs)
+    time_splits = onsets_to_time_splits(onsets, duration, kwargs.get("min_segment", 0.25))
+
+    if review_file is not None:
+        with open(review_file, 'w') as f:
+            f.write(format_time_splits(time_splits))
+        print(f"Detected time splits written to: {review_file}")
+
+    split_audio_file(input_filename, time_splits, output_dir=output_dir)
+    return time_splits
+
 # Your time splits
 time_splits = [
     [14.83, 18.35],
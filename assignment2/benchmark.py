@@ -0,0 +1,309 @@
+## Benchmark suite for the binaural rendering path
+## - filter construction time per angle for every way of building the filters
+## - the 512+ tap hrir_gen FIR against the direct hrtiir IIR + ITD delay and
+##   against the truncated STFT ear kernels, checked against stated tolerances
+## - rendering throughput per source, peak memory and error against the FIR
+##   reference render for the block renderers over block sizes and source counts,
+##   with a pass flag per case and a summary of each renderer against per source
+##   render_direct (the STFT path runs with integer ITD so it is comparable)
+## - growing the output with np.concatenate against a preallocated buffer
+##
+##   python benchmark.py --output bench.json
+##   python benchmark.py --quick --compare bench.json
+
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+import numpy as np
+from scipy.signal import lfilter
+from binaural_stream import StreamRenderer, ear_filters
+from hrir_bank import HRIRBank
+from hrir_gen import hrir_gen, render_direct
+from hrtfiir import hrtiir
+from stft_render import STFTRenderer, ear_spectra
+
+fs = 44100
+c_air = 343
+h_radius = 0.09
+
+CASES = {
+    "angles": [-90, -45, 0, 30, 90],
+    "length": [4410, 44100, 441000],
+    "sources": [1, 4, 16, 64, 256],
+    "block_size": [128, 512, 2048],
+    "n_angles": 361,
+}
+QUICK_CASES = {
+    "angles": [-90, 0, 90],
+    "length": [44100],
+    "sources": [1, 16],
+    "block_size": [512],
+    "n_angles": 91,
+}
+TOLERANCE = 1e-12 # max |direct - fir| relative to max |x|
+KERNEL_TOLERANCE = 1e-12 # max |stft kernel - hrir_gen fir| with integer ITD, i.e. the truncation loss
+RENDER_TOLERANCE = 1e-12 # RMS error of a renderer against the FIR reference render, relative to its RMS
+RENDERERS = {
+    "stream": lambda block_size: StreamRenderer(fs, h_radius, c_air, block_size),
+    "stft": lambda block_size: STFTRenderer(fs, h_radius, c_air, block_size, integer_itd=True),
+}
+
+
+def _best(fn, *args, repeat=3):
+    # fastest of a few runs, returns the last output and the time
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return out, best
+
+def render_fir(x, inc_angle):
+    hL, hR = hrir_gen(inc_angle, h_radius, fs, c_air)
+    return lfilter(hL, [1.0], x), lfilter(hR, [1.0], x)
+
+def bench_direct(cases, seed=0, repeat=3):
+    rng = np.random.default_rng(seed)
+    results = []
+    for length in cases["length"]:
+        x = rng.standard_normal(length)
+        for ang in cases["angles"]:
+            (fL, fR), fir_s = _best(render_fir, x, ang, repeat=repeat)
+            (dL, dR), direct_s = _best(render_direct, x, ang, h_radius, fs, c_air, repeat=repeat)
+            error = max(np.max(np.abs(fL - dL)), np.max(np.abs(fR - dR))) / np.max(np.abs(x))
+            case = {
+                "angle": ang,
+                "length": length,
+                "fir_s": fir_s,
+                "direct_s": direct_s,
+                "speedup": fir_s / direct_s,
+                "max_error": float(error),
+                "within_tolerance": bool(error <= TOLERANCE),
+            }
+            results.append(case)
+            print(f"angle={ang:<4d} N={length:<7d} fir={fir_s*1e3:8.3f} ms direct={direct_s*1e3:7.3f} ms "
+                  f"speedup={case['speedup']:6.1f}x error={error:.2e}")
+    return results
+
+def bench_kernels(cases, nfft=4096):
+    # the truncated integer ITD ear kernels of the STFT path against the full hrir_gen FIRs
+    results = []
+    for ang in cases["angles"]:
+        kernels = np.fft.irfft(ear_spectra(float(ang), h_radius, fs, c_air, nfft, True), nfft)
+        ref = np.zeros((2, nfft))
+        for ear, h in enumerate(hrir_gen(ang, h_radius, fs, c_air)):
+            ref[ear, :min(len(h), nfft)] = h[:nfft]
+        error = float(np.max(np.abs(kernels - ref)))
+        results.append({"angle": ang, "max_error": error, "within_tolerance": error <= KERNEL_TOLERANCE})
+        print(f"stft kernel angle={ang:<4d} error={error:.2e}")
+    return results
+
+def bench_construction(cases, repeat=3):
+    # seconds per angle to build the filters, one angle at a time or the whole grid at once
+    angles = np.linspace(-90, 90, cases["n_angles"])
+    n = len(angles)
+
+    def stft_uncached():
+        ear_spectra.cache_clear()
+        for ang in angles:
+            ear_spectra(float(ang), h_radius, fs, c_air, 2048)
+
+    timings = {
+        "hrir_gen": lambda: [hrir_gen(ang, h_radius, fs, c_air) for ang in angles],
+        "hrtiir": lambda: [hrtiir(ang, h_radius, fs, c_air) for ang in angles],
+        "hrtiir_vectorized": lambda: hrtiir(angles, h_radius, fs, c_air),
+        "ear_filters_vectorized": lambda: ear_filters(angles, h_radius, fs, c_air),
+        "hrir_bank": lambda: HRIRBank(fs, h_radius, c_air, angles),
+        "ear_spectra": stft_uncached,
+    }
+    results = {}
+    for name, fn in timings.items():
+        _, seconds = _best(fn, repeat=repeat)
+        results[name] = seconds / n
+        print(f"construction {name:<24s} {seconds / n * 1e6:9.2f} us/angle")
+    return results
+
+def render_per_source(signals, angles):
+    # the plain time domain path, one render_direct call per source
+    out = np.zeros((signals.shape[1], 2))
+    for x, ang in zip(signals, angles):
+        yL, yR = render_direct(x, ang, h_radius, fs, c_air)
+        out[:, 0] += yL
+        out[:, 1] += yR
+    return out
+
+def render_reference(signals, angles):
+    # the original path: hrir_gen FIRs through lfilter, per source
+    out = np.zeros((signals.shape[1], 2))
+    for x, ang in zip(signals, angles):
+        yL, yR = render_fir(x, ang)
+        out[:, 0] += yL
+        out[:, 1] += yR
+    return out
+
+def _peak_memory(fn):
+    # peak bytes allocated through numpy/python while fn runs
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_render(cases, duration=1.0, seed=0, repeat=3):
+    # throughput per source, peak memory and error against the FIR reference for every
+    # renderer, block size and source count, with per source render_direct as the baseline
+    rng = np.random.default_rng(seed)
+    N = int(duration * fs)
+    results = []
+    for n_sources in cases["sources"]:
+        signals = rng.standard_normal((n_sources, N))
+        angles = list(np.linspace(-90, 90, n_sources))
+        ref = render_reference(signals, angles)
+        rms = np.sqrt(np.mean(ref ** 2))
+
+        configs = [("per_source", None, lambda: render_per_source(signals, angles))]
+        for name, make in RENDERERS.items():
+            for block_size in cases["block_size"]:
+                configs.append((name, block_size, lambda make=make, b=block_size: make(b).render(signals, angles)))
+
+        for name, block_size, fn in configs:
+            out, seconds = _best(fn, repeat=repeat)
+            case = {
+                "renderer": name,
+                "block_size": block_size,
+                "sources": n_sources,
+                "duration": duration,
+                "seconds": seconds,
+                "samples_per_s_per_source": N / seconds,
+                "realtime_sources": n_sources * duration / seconds,
+                "peak_memory_bytes": _peak_memory(fn),
+                "rel_error": float(np.sqrt(np.mean((out - ref) ** 2)) / rms),
+            }
+            case["within_tolerance"] = case["rel_error"] <= RENDER_TOLERANCE
+            results.append(case)
+            print(f"render {name:<10s} block={str(block_size):<5s} sources={n_sources:<4d} "
+                  f"{case['samples_per_s_per_source'] / 1e6:7.2f} Msamples/s/source "
+                  f"{case['realtime_sources']:8.1f} realtime sources "
+                  f"peak={case['peak_memory_bytes'] / 1e6:7.1f} MB error={case['rel_error']:.2e}"
+                  f"{'' if case['within_tolerance'] else ' OUT OF TOLERANCE'}")
+    return results
+
+def summarize_render(results):
+    # per source count: the best block size of every renderer against per source render_direct,
+    # so it is plain which path is fastest and whether it is accurate
+    summary = []
+    for n_sources in sorted({case["sources"] for case in results}):
+        best = {}
+        for case in results:
+            if case["sources"] == n_sources:
+                prev = best.get(case["renderer"])
+                if prev is None or case["realtime_sources"] > prev["realtime_sources"]:
+                    best[case["renderer"]] = case
+        baseline = best["per_source"]["realtime_sources"]
+        fastest = max(best.values(), key=lambda case: case["realtime_sources"])
+        for name, case in best.items():
+            summary.append({
+                "sources": n_sources,
+                "renderer": name,
+                "block_size": case["block_size"],
+                "realtime_sources": case["realtime_sources"],
+                "vs_per_source": case["realtime_sources"] / baseline,
+                "rel_error": case["rel_error"],
+                "within_tolerance": case["within_tolerance"],
+            })
+            verdict = "baseline" if name == "per_source" else "faster" if case["realtime_sources"] > baseline else "slower"
+            print(f"sources={n_sources:<4d} {name:<10s} {case['realtime_sources']:8.1f} realtime sources, "
+                  f"{case['realtime_sources'] / baseline:5.2f}x per source render_direct ({verdict}), "
+                  f"error {case['rel_error']:.1e} {'ok' if case['within_tolerance'] else 'OUT OF TOLERANCE'}")
+        print(f"sources={n_sources:<4d} fastest: {fastest['renderer']}")
+    return summary
+
+def bench_concatenate(n_bursts=(7, 70, 700), burst=11025, gap=2205, repeat=3):
+    # task5_demo style output assembly: growing with np.concatenate against writing into
+    # a preallocated buffer
+    results = []
+    y = np.ones(burst)
+    silence = np.zeros(gap)
+    for n in n_bursts:
+        def grow():
+            total = np.array([])
+            for _ in range(n):
+                total = np.concatenate((total, y, silence))
+            return total
+
+        def prealloc():
+            total = np.zeros(n * (burst + gap))
+            for i in range(n):
+                total[i * (burst + gap):i * (burst + gap) + burst] = y
+            return total
+
+        _, grow_s = _best(grow, repeat=repeat)
+        _, prealloc_s = _best(prealloc, repeat=repeat)
+        results.append({"bursts": n, "concatenate_s": grow_s, "preallocated_s": prealloc_s,
+                        "speedup": grow_s / prealloc_s})
+        print(f"assembly bursts={n:<4d} concatenate={grow_s * 1e3:9.3f} ms preallocated={prealloc_s * 1e3:7.3f} ms "
+              f"speedup={grow_s / prealloc_s:6.1f}x")
+    return results
+
+def _render_key(case):
+    return (case["renderer"], case["block_size"], case["sources"], case["duration"])
+
+def compare(new, old):
+    # throughput ratio of every render case against a previous run, >1 means faster now
+    old_cases = {_render_key(c): c for c in old.get("render", [])}
+    for case in new["render"]:
+        prev = old_cases.get(_render_key(case))
+        if prev is None:
+            continue
+        ratio = case["samples_per_s_per_source"] / prev["samples_per_s_per_source"]
+        print(f"{case['renderer']:<10s} block={str(case['block_size']):<5s} sources={case['sources']:<4d} "
+              f"throughput={ratio:.2f}x error {prev['rel_error']:.2e} -> {case['rel_error']:.2e}")
+    for name, seconds in new["construction"].items():
+        if name in old.get("construction", {}):
+            print(f"construction {name:<24s} {old['construction'][name] / seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the binaural rendering path")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--quick", action="store_true", help="run a small subset of the cases")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds of audio per source")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", default=None, help="previous results file to compare against")
+    args = parser.parse_args()
+
+    cases = QUICK_CASES if args.quick else CASES
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "fs": fs,
+        "tolerance": TOLERANCE,
+        "construction": bench_construction(cases),
+        "direct_vs_fir": bench_direct(cases, args.seed),
+        "stft_kernels": bench_kernels(cases),
+        "render": bench_render(cases, args.duration, args.seed),
+        "assembly": bench_concatenate(),
+    }
+    report["render_summary"] = summarize_render(report["render"])
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+    if not all(case["within_tolerance"] for case in report["direct_vs_fir"]):
+        raise SystemExit("Direct rendering differs from the FIR path by more than the tolerance")
+    if not all(case["within_tolerance"] for case in report["stft_kernels"]):
+        raise SystemExit("STFT ear kernels differ from the FIR path by more than the kernel tolerance")
+    failed = sorted({case["renderer"] for case in report["render"] if not case["within_tolerance"]})
+    if failed:
+        raise SystemExit(f"Renderers out of tolerance against the FIR reference: {', '.join(failed)}")
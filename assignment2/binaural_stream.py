@@ -0,0 +1,200 @@
+import numpy as np
+from hrir import hrir_delays
+from hrtfiir import hrtiir, hrtiir_filter
+
+
+def max_itd_samples(h_radius, fs, c_air):
+    # largest delay hrir gives for any angle in [-180, 180]
+    return int(np.ceil(h_radius / c_air * np.pi * fs))
+
+def ear_filters(inc_angle, h_radius, fs, c_air):
+    # numerators stacked as (..., ear, 2), the shared denominator and the delays as (..., ear)
+    inc_angle = (np.asarray(inc_angle, dtype=np.float64) + 180) % 360 - 180
+    BL, AL, BR, AR = hrtiir(inc_angle, h_radius, fs, c_air)
+    delay_left, delay_right = hrir_delays(inc_angle, h_radius, fs, c_air)
+    return np.stack([BL, BR], axis=-2), AL, np.stack([delay_left, delay_right], axis=-1)
+
+
+class BlockRenderer:
+    """
+    Whole signal and generator front ends shared by the block renderers.
+
+    Subclasses provide block_size, __len__, add_source(angle) and
+    process(blocks, angles, out).
+    """
+
+    def render(self, signals, angles):
+        """
+        Renders whole signals block by block into one preallocated (N, 2) array.
+
+        Parameters:
+        - signals: (n_sources, N) array of mono signals
+        - angles: azimuth per source, either fixed or one value per block
+          of block_size samples for moving sources
+        """
+        signals = np.atleast_2d(signals)
+        n_sources, N = signals.shape
+        angles = [np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in angles]
+        while len(self) < n_sources:
+            self.add_source(float(angles[len(self)][0]))
+
+        out = np.zeros((N, 2))
+        for k, start in enumerate(range(0, N, self.block_size)):
+            stop = min(start + self.block_size, N)
+            block_angles = [a[min(k, len(a) - 1)] for a in angles]
+            self.process(signals[:, start:stop], block_angles, out=out[start:stop])
+        return out
+
+    def stream(self, blocks, angles=None):
+        # generator over a mono block iterator for one source, angles per block or fixed
+        if not len(self):
+            # start at the first angle so the first block is not crossfaded from 0 degrees
+            self.add_source(0.0 if angles is None else float(angles[0] if np.ndim(angles) else angles))
+        for k, x in enumerate(blocks):
+            block_angles = None
+            if angles is not None:
+                block_angles = [angles[min(k, len(angles) - 1)] if np.ndim(angles) else angles]
+            yield self.process([x], block_angles).copy()
+
+
+class StreamRenderer(BlockRenderer):
+    """
+    Block based binaural renderer for any number of mono sources.
+
+    Every source runs the first-order hrtiir filter of each ear with its
+    state carried between blocks, followed by the hrir ITD as a delay line
+    of max_itd_samples + block_size samples. All sources are filtered
+    together with hrtiir_filter and their delay lines are one array, so a
+    block costs a handful of array operations whatever the number of
+    sources. When the azimuth of a source changes, the next block is
+    rendered with both the old and the new coefficients and delays and
+    crossfaded over `crossfade` samples, so moving sources do not click.
+    All buffers are allocated up front and the cost of a block only
+    depends on its length and the number of sources.
+
+    Parameters:
+    - fs, h_radius, c_air: model parameters, as for hrtiir and hrir
+    - block_size: largest number of samples per block
+    - crossfade: length of the crossfade on angle changes, at most block_size
+    """
+
+    def __init__(self, fs=44100, h_radius=0.09, c_air=343, block_size=512, crossfade=None):
+        self.fs = fs
+        self.h_radius = h_radius
+        self.c_air = c_air
+        self.block_size = block_size
+        self.crossfade = block_size if crossfade is None else max(1, min(crossfade, block_size))
+        self.max_delay = max_itd_samples(h_radius, fs, c_air)
+        _, self.A, _ = ear_filters(0.0, h_radius, fs, c_air) # the same for every angle and ear
+
+        self.angles = np.zeros(0)
+        self.B = np.zeros((0, 2, 2))
+        self.delays = np.zeros((0, 2), dtype=np.int64)
+        self.target_angles = np.zeros(0)
+        self.target_B = np.zeros((0, 2, 2))
+        self.target_delays = np.zeros((0, 2), dtype=np.int64)
+        self.state = np.zeros((0, 1))
+        self.line = np.zeros((0, 2, self.max_delay + block_size))
+        self._out = np.zeros((block_size, 2))
+
+    def __len__(self):
+        return len(self.angles)
+
+    def add_source(self, inc_angle=0.0):
+        B, _, delays = ear_filters(inc_angle, self.h_radius, self.fs, self.c_air)
+        self.angles = np.append(self.angles, inc_angle)
+        self.B = np.concatenate((self.B, B[None]))
+        self.delays = np.concatenate((self.delays, delays[None]))
+        # pending set_angle changes of the other sources stay in the targets
+        self.target_angles = np.append(self.target_angles, inc_angle)
+        self.target_B = np.concatenate((self.target_B, B[None]))
+        self.target_delays = np.concatenate((self.target_delays, delays[None]))
+        self.state = np.concatenate((self.state, np.zeros((1, 1))))
+        self.line = np.concatenate((self.line, np.zeros((1,) + self.line.shape[1:])))
+        return len(self) - 1
+
+    def reset(self):
+        # silence: clears the filter states and delay lines, angles are kept
+        self.state[:] = 0.0
+        self.line[:] = 0.0
+
+    def set_angle(self, i, inc_angle):
+        # the change is crossfaded in during the next block
+        self.set_angles(np.where(np.arange(len(self)) == i, inc_angle, self.target_angles))
+
+    def set_angles(self, angles):
+        # new azimuth for every source at once
+        angles = np.asarray(angles, dtype=np.float64)
+        changed = angles != self.target_angles
+        if changed.any():
+            B, _, delays = ear_filters(angles[changed], self.h_radius, self.fs, self.c_air)
+            self.target_angles[changed] = angles[changed]
+            self.target_B[changed] = B
+            self.target_delays[changed] = delays
+
+    def _ramp(self, n):
+        m = min(self.crossfade, n)
+        return np.minimum(np.arange(1, n + 1) / m, 1.0)
+
+    def _delayed_mix(self, delays, n):
+        # sum of all delay lines read at their delays, sources with the same delay are summed in one slice
+        d0 = self.max_delay
+        mix = np.zeros((2, n))
+        for ear in range(2):
+            column = delays[:, ear]
+            for d in np.unique(column):
+                mix[ear] += self.line[column == d, ear, d0 - d:d0 - d + n].sum(axis=0)
+        return mix
+
+    def _render(self, x, out):
+        n = x.shape[-1]
+        d0 = self.max_delay
+        moving = self.target_angles != self.angles
+
+        if moving.any():
+            # old and new coefficients share the recursive part, so both come from one call
+            y, state = hrtiir_filter(x[:, None, None, :], np.stack([self.B, self.target_B], axis=1),
+                                     self.A, self.state[:, :, None])
+            self.state = state[:, :, 0]
+            ramp = self._ramp(n)
+            y = y[:, 0] + ramp * (y[:, 1] - y[:, 0])
+        else:
+            y, self.state = hrtiir_filter(x[:, None, :], self.B, self.A, self.state)
+        self.line[:, :, d0:d0 + n] = y
+        # a decaying filter of a silent source would get stuck at denormal values, which are
+        # very slow to compute with, so states far below audibility are flushed to zero
+        self.state[np.abs(self.state) < 1e-30] = 0.0
+
+        mix = self._delayed_mix(self.delays, n)
+        if moving.any():
+            mix += ramp * (self._delayed_mix(self.target_delays, n) - mix)
+            self.angles = self.target_angles.copy()
+            self.B = self.target_B.copy()
+            self.delays = self.target_delays.copy()
+        out[:n] += mix.T
+
+        # keep the last max_delay samples for the next block
+        self.line[:, :, :d0] = self.line[:, :, n:n + d0]
+
+    def process(self, blocks, angles=None, out=None):
+        """
+        Renders one block of every source and returns the (n, 2) mix.
+
+        Parameters:
+        - blocks: (n_sources, n) array with n <= block_size samples per source
+        - angles: optional new azimuth per source for this block
+        - out: optional (n, 2) array to write the mix to, by default an
+          internal buffer that is overwritten by the next call
+        """
+        x = np.asarray(blocks, dtype=np.float64).reshape(len(self), -1)
+        n = x.shape[-1]
+        if n > self.block_size:
+            raise ValueError(f"Block of {n} samples is longer than block_size={self.block_size}")
+        if out is None:
+            out = self._out[:n]
+        out[:] = 0.0
+        if angles is not None:
+            self.set_angles(angles)
+        if n and len(self):
+            self._render(x, out)
+        return out
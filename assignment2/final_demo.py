@@ -1,11 +1,12 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import lfilter
-import sounddevice as sd
 from hrir import hrir
 from hrtf1 import hrtf1
 from hrtfiir import hrtiir
-from hrir_gen import hrir_gen
+from hrir_gen import render_direct
+from noise import NoiseGenerator
+from binaural_stream import StreamRenderer
+from realtime import RealtimePlayer
 
 fs = 44100
 c_air = 343
@@ -16,37 +17,27 @@ gap_dur = 0.05
 play_demo = True
 
 
-def pink_noise(N):
-    # 1/f pink noise using frequency shaping
-    X = np.random.randn(N//2 + 1) + 1j*np.random.randn(N//2 + 1)
-    f = np.linspace(1, N//2 + 1, N//2 + 1)
-    X /= np.sqrt(f)
-    x = np.fft.irfft(X)
-    x /= np.max(np.abs(x))
-    return x
-
-
 def task5_demo():
     N_burst = int(burst_dur * fs)
     N_gap = int(gap_dur * fs)
-    silence = np.zeros(N_gap)
+    N_step = N_burst + N_gap
 
-    L_total = np.array([])
-    R_total = np.array([])
+    # output is allocated once, bursts are written into it
+    L_total = np.zeros(len(angles) * N_step)
+    R_total = np.zeros(len(angles) * N_step)
 
-    for ang in angles:
-        burst = pink_noise(N_burst)
+    # one seeded pink noise stream for all bursts
+    noise = NoiseGenerator("pink", seed=0, fs=fs)
 
-        # get hrirs for this angle
-        hL, hR = hrir_gen(ang, h_radius, fs, c_air)
+    for i, ang in enumerate(angles):
+        burst = noise.read(N_burst)
 
-        # filter through hrirs (iir + itd)
-        yL = lfilter(hL, [1.0], burst)
-        yR = lfilter(hR, [1.0], burst)
+        # filter through the iir and itd directly, same result as the hrir_gen firs
+        yL, yR = render_direct(burst, ang, h_radius, fs, c_air)
 
-        # append with gap
-        L_total = np.concatenate((L_total, yL, silence))
-        R_total = np.concatenate((R_total, yR, silence))
+        # write burst, the gap stays silent
+        L_total[i * N_step:i * N_step + N_burst] = yL
+        R_total[i * N_step:i * N_step + N_burst] = yR
 
     maxamp = max(np.max(np.abs(L_total)), np.max(np.abs(R_total)))
     L_total /= maxamp
@@ -71,11 +62,24 @@ def task5_demo():
     plt.tight_layout()
     plt.show()
 
+    import sounddevice as sd # only needed for playback, the realtime demo's null and file backends run without it
     sd.play(stereo, fs)
     sd.wait()
 
     return stereo
 
 
+def realtime_demo(duration=5.0, backend="sounddevice", sweep_period=4.0, **backend_kwargs):
+    # pink noise circling from -90 to 90 degrees, rendered block by block while it plays,
+    # backend="null" or "file" (e.g. with output_file=...) runs without an audio device
+    renderer = StreamRenderer(fs, h_radius, c_air, block_size=256)
+    noise = NoiseGenerator("pink", seed=0, fs=fs)
+    player = RealtimePlayer(renderer, [noise], angles=lambda t: [90 * np.sin(2 * np.pi * t / sweep_period)],
+                            backend=backend, **backend_kwargs)
+    player.run(duration)
+    print(player.report())
+    return player.metrics()
+
+
 if __name__ == "__main__":
     stereo_out = task5_demo()
@@ -26,6 +26,15 @@ def hrir(inc_angle, h_radius, fs, c_air):
     
     return h_left, h_right
 
+def hrir_delays(inc_angle, h_radius, fs, c_air):
+    # position of the impulse in each hrir response, for arrays of angles
+    theta = np.deg2rad(np.asarray(inc_angle, dtype=np.float64))
+    delta_t = (h_radius / c_air) * (theta + np.sin(theta))
+    delta_samples = np.round(np.abs(delta_t) * fs).astype(np.int64)
+    delay_left = np.where(theta >= 0, delta_samples, 0)
+    delay_right = np.where(theta >= 0, 0, delta_samples)
+    return delay_left, delay_right
+
 '''
 # Parameters
 fs = 44100
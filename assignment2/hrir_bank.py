@@ -0,0 +1,97 @@
+import numpy as np
+from hrir import hrir_delays
+from hrtfiir import hrtiir, hrtiir_filter
+
+IMPULSE_LENGTH = 512 # as in hrir_gen
+
+
+class HRIRBank:
+    """
+    Left and right HRIRs precomputed on an azimuth grid.
+
+    Every response of hrir_gen is zero padded to a common length and
+    stored in one contiguous array of shape (n_angles, 2, length), so a
+    lookup is an index into the table instead of a filter design and an
+    impulse response per call. Angles between grid points are linearly
+    interpolated, angles outside the grid are clipped to its ends.
+
+    Parameters:
+    - fs, h_radius, c_air: model parameters, as for hrir_gen
+    - angles: the azimuth grid in degrees, must be increasing
+    """
+
+    def __init__(self, fs=44100, h_radius=0.09, c_air=343, angles=np.arange(-90, 90.5, 0.5), hrirs=None):
+        self.fs = fs
+        self.h_radius = h_radius
+        self.c_air = c_air
+        self.angles = np.asarray(angles, dtype=np.float64)
+        self.hrirs = self._build() if hrirs is None else np.ascontiguousarray(hrirs, dtype=np.float64)
+
+    def _build(self):
+        # the hrir_gen responses of every angle at once: hrtiir impulse responses shifted by the hrir delays
+        BL, AL, BR, AR = hrtiir(self.angles, self.h_radius, self.fs, self.c_air)
+        delay_left, delay_right = hrir_delays(self.angles, self.h_radius, self.fs, self.c_air)
+        impulse = np.zeros(IMPULSE_LENGTH)
+        impulse[0] = 1.0
+        h, _ = hrtiir_filter(impulse, np.stack([BL, BR], axis=-2), AL[..., None, :])
+
+        delays = np.stack([delay_left, delay_right], axis=-1)
+        hrirs = np.zeros((len(self.angles), 2, IMPULSE_LENGTH + int(delays.max(initial=0))))
+        np.put_along_axis(hrirs, delays[..., None] + np.arange(IMPULSE_LENGTH), h, axis=2)
+        return hrirs
+
+    @property
+    def length(self):
+        return self.hrirs.shape[-1]
+
+    def _weights(self, inc_angle):
+        # lower grid index and weight of the next one for every angle
+        a = np.clip(np.asarray(inc_angle, dtype=np.float64), self.angles[0], self.angles[-1])
+        i = np.clip(np.searchsorted(self.angles, a, side='right') - 1, 0, max(len(self.angles) - 2, 0))
+        if len(self.angles) < 2:
+            return i, np.zeros_like(a)
+        w = (a - self.angles[i]) / (self.angles[i + 1] - self.angles[i])
+        return i, w
+
+    def lookup(self, inc_angle, interpolate=True):
+        # (2, length) for a scalar angle, (n, 2, length) for an array of angles
+        i, w = self._weights(inc_angle)
+        if not interpolate or len(self.angles) < 2:
+            i = np.where(w > 0.5, i + 1, i) if len(self.angles) > 1 else i
+            return self.hrirs[i]
+        w = w[..., None, None]
+        return (1 - w) * self.hrirs[i] + w * self.hrirs[i + 1]
+
+    def __call__(self, inc_angle):
+        hrirs = self.lookup(inc_angle)
+        return hrirs[..., 0, :], hrirs[..., 1, :]
+
+    def matches(self, fs, h_radius, c_air):
+        return (self.fs, self.h_radius, self.c_air) == (fs, h_radius, c_air)
+
+    def save(self, filename):
+        np.savez(_npz_name(filename), fs=self.fs, h_radius=self.h_radius, c_air=self.c_air, angles=self.angles, hrirs=self.hrirs)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(_npz_name(filename)) as data:
+            return cls(data["fs"].item(), data["h_radius"].item(), data["c_air"].item(), data["angles"], data["hrirs"])
+
+    @classmethod
+    def cached(cls, filename, fs=44100, h_radius=0.09, c_air=343, angles=np.arange(-90, 90.5, 0.5)):
+        # loads the bank from filename, rebuilding and saving it if the parameters changed
+        filename = _npz_name(filename)
+        try:
+            bank = cls.load(filename)
+            if bank.matches(fs, h_radius, c_air) and np.array_equal(bank.angles, angles):
+                return bank
+        except (OSError, KeyError, ValueError):
+            pass
+        bank = cls(fs, h_radius, c_air, angles)
+        bank.save(filename)
+        return bank
+
+
+def _npz_name(filename):
+    # np.savez appends .npz to names without it, np.load does not
+    return filename if str(filename).endswith(".npz") else f"{filename}.npz"
@@ -2,9 +2,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 def hrtf1(inc_angle, h_radius, fs, c_air, nfft):
-    theta = np.deg2rad(inc_angle)
+    # inc_angle and h_radius may be arrays, the responses then get their
+    # broadcast shape in front of the frequency axis, e.g. (n_angles, nfft//2 + 1)
+    theta = np.deg2rad(np.asarray(inc_angle, dtype=np.float64))[..., None]
     fvec = np.linspace(0, fs/2, nfft//2 + 1)
-    beta = (2*c_air) / h_radius
+    beta = (2*c_air) / np.asarray(h_radius, dtype=np.float64)[..., None]
     omega = 2 * np.pi * fvec
     
     alpha_left = 1 - np.sin(theta)
@@ -1,10 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy.signal import lfilter
 
 def hrtiir(inc_angle, h_radius, fs, c_air):
-    theta = np.deg2rad(inc_angle)
+    # inc_angle and h_radius may be arrays, the coefficients then get their
+    # broadcast shape in front of the last axis, e.g. (n_angles, 2)
+    theta = np.deg2rad(np.asarray(inc_angle, dtype=np.float64))
     T = 1 / fs
-    beta = (2 * c_air) / h_radius
+    beta = (2 * c_air) / np.asarray(h_radius, dtype=np.float64)
     alpha_left = 1 - np.sin(theta)
     alpha_right = 1 + np.sin(theta)
 
@@ -20,14 +23,57 @@ def hrtiir(inc_angle, h_radius, fs, c_air):
     B_1_right = ((T*beta) - (2*alpha_right))/A_0
 
     # packing into arrays
-    BL = np.array([B_0_left, B_1_left])
-    BR = np.array([B_0_right, B_1_right])
-    AL = np.array([1, A_1])
-    AR = np.array([1, A_1])
+    BL = np.stack(np.broadcast_arrays(B_0_left, B_1_left), axis=-1)
+    BR = np.stack(np.broadcast_arrays(B_0_right, B_1_right), axis=-1)
+    AL = np.stack(np.broadcast_arrays(np.ones_like(B_0_left), A_1 + np.zeros_like(B_0_left)), axis=-1)
+    AR = AL.copy()
 
     return BL, AL, BR, AR
 
 
+def hrtiir_filter(x, B, A, state=None):
+    """
+    Filters many signals with their own first-order hrtiir sections in one call.
+
+    x is (..., N) and B, A are (..., 2) coefficients as returned by hrtiir,
+    broadcast against the leading axes of x. The recursive part only
+    depends on A, so it is run once per row of the broadcast of x and A,
+    and the two numerator taps of B are applied on top of it. Passing
+    x as (n_sources, 1, N), A from one radius and B as BL and BR stacked
+    to (n_sources, 2, 2) renders both ears of every source with a single
+    lfilter call.
+
+    Parameters:
+    - state: last output of the recursive part from the previous call,
+      as returned here, to filter long signals block by block
+
+    Returns the filtered signals and the new state.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    B = np.asarray(B, dtype=np.float64)
+    A = np.asarray(A, dtype=np.float64)
+    lead = np.broadcast_shapes(x.shape[:-1], A.shape[:-1])
+    N = x.shape[-1]
+
+    xb = np.broadcast_to(x, lead + (N,)).reshape(-1, N)
+    a1 = np.broadcast_to(A[..., 1] / A[..., 0], lead).reshape(-1)
+    prev = np.zeros(len(a1)) if state is None else np.broadcast_to(state, lead).reshape(-1)
+
+    # w[n] = x[n] - a1 w[n-1], one lfilter per distinct pole (usually just one)
+    w = np.empty((len(a1), N + 1))
+    w[:, 0] = prev
+    for pole in np.unique(a1):
+        rows = a1 == pole
+        w[rows, 1:], _ = lfilter([1.0], [1.0, pole], xb[rows], axis=-1, zi=(-pole * prev[rows])[:, None])
+    w = w.reshape(lead + (N + 1,))
+
+    # both numerator taps as one batched (1, 2) @ (2, N) product
+    B = B / A[..., :1]
+    taps = np.stack([w[..., 1:], w[..., :-1]], axis=-2)
+    y = np.matmul(B[..., None, :], taps)[..., 0, :]
+    return y, w[..., -1].copy()
+
+
 if __name__ == "__main__":
     from scipy.signal import freqz
     
@@ -0,0 +1,70 @@
+import numpy as np
+from scipy.signal import lfilter
+
+# -10 dB/decade pinking filter, within 0.5 dB of 1/f over three decades
+PINK_B = np.array([0.049922035, -0.095993537, 0.050612699, -0.004408786])
+PINK_A = np.array([1.0, -2.494956002, 2.017265875, -0.522189400])
+BROWN_CORNER = 10.0 # Hz, the integrator leaks below this so the signal cannot drift away
+
+
+class NoiseGenerator:
+    """
+    Endless seeded white, pink or brown noise, read block by block.
+
+    Pink and brown noise are white noise through a recursive filter whose
+    state is kept between reads, so blocks of any size join seamlessly
+    and the cost per sample is constant. The output is scaled by the
+    filter's noise gain, known from its impulse response, to the given
+    RMS level instead of normalizing by the peak of the whole signal.
+    The filter is warmed up on creation so the level is stationary from
+    the first sample.
+
+    Parameters:
+    - color: "white", "pink" or "brown"
+    - seed: seed for numpy's default_rng, None for a random one
+    - rms: RMS level of the output
+    - fs: sample rate, only used for the brown noise corner frequency
+    """
+
+    def __init__(self, color="pink", seed=None, rms=0.25, fs=44100):
+        self.color = color
+        self.rng = np.random.default_rng(seed)
+        if color == "white":
+            self.b, self.a = np.array([1.0]), np.array([1.0])
+        elif color == "pink":
+            self.b, self.a = PINK_B, PINK_A
+        elif color == "brown":
+            pole = np.exp(-2 * np.pi * BROWN_CORNER / fs)
+            self.b, self.a = np.array([1.0 - pole]), np.array([1.0, -pole])
+        else:
+            raise ValueError(f"Unknown noise color '{color}', use white, pink or brown")
+
+        # the impulse response is long enough once the slowest pole has decayed by 1e-12
+        slowest = max((np.max(np.abs(np.roots(self.a))) if len(self.a) > 1 else 0.0), 0.5)
+        settle = int(np.ceil(np.log(1e-12) / np.log(slowest)))
+        impulse = np.zeros(settle)
+        impulse[0] = 1.0
+        self.gain = rms / np.sqrt(np.sum(lfilter(self.b, self.a, impulse) ** 2))
+
+        self.zi = np.zeros(max(len(self.a), len(self.b)) - 1) if len(self.a) > 1 else None
+        if self.zi is not None:
+            self.read(settle)
+
+    def read(self, n):
+        # the next n samples
+        x = self.rng.standard_normal(n)
+        if self.zi is None:
+            return x * self.gain
+        y, self.zi = lfilter(self.b, self.a, x, zi=self.zi)
+        y *= self.gain
+        return y
+
+    def blocks(self, block_size=512, n_blocks=None):
+        # generator of blocks, endless unless n_blocks is given
+        k = 0
+        while n_blocks is None or k < n_blocks:
+            yield self.read(block_size)
+            k += 1
+
+    def __iter__(self):
+        return self.blocks()
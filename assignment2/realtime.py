@@ -0,0 +1,221 @@
+import threading
+import time
+import wave
+import numpy as np
+
+
+class NullBackend:
+    """
+    Output stream without an audio device.
+
+    A thread calls the callback with sounddevice's signature once per
+    block and throws the audio away. With realtime=True it waits for each
+    block's deadline like a sound card would, otherwise blocks are pulled
+    as fast as the callback allows, which measures the headroom.
+    """
+
+    def __init__(self, fs, block_size, realtime=True):
+        self.fs = fs
+        self.block_size = block_size
+        self.realtime = realtime
+        self.latency = block_size / fs # one block is buffered before it is heard
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, callback):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(callback,), daemon=True)
+        self._thread.start()
+
+    def _run(self, callback):
+        outdata = np.zeros((self.block_size, 2), dtype=np.float32)
+        period = self.block_size / self.fs
+        start = time.perf_counter()
+        k = 0
+        while not self._stop.is_set():
+            if self.realtime:
+                delay = start + k * period - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            callback(outdata, self.block_size, None, None)
+            self.write(outdata)
+            k += 1
+
+    def write(self, outdata):
+        pass
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.close()
+
+    def close(self):
+        pass
+
+
+class FileSinkBackend(NullBackend):
+    # the null backend writing every block to a 16 bit stereo WAV
+
+    def __init__(self, fs, block_size, output_file="realtime_out.wav", realtime=True):
+        super().__init__(fs, block_size, realtime)
+        self.output_file = output_file
+        self._wav = wave.open(output_file, 'wb')
+        self._wav.setnchannels(2)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(fs)
+
+    def write(self, outdata):
+        self._wav.writeframes(np.clip(np.rint(outdata * 32767), -32768, 32767).astype('<i2').tobytes())
+
+    def close(self):
+        self._wav.close()
+
+
+class SoundDeviceBackend:
+    # a sounddevice OutputStream, imported on use so the other backends work without it
+
+    def __init__(self, fs, block_size, latency="low", device=None):
+        import sounddevice as sd
+        self._sd = sd
+        self.fs = fs
+        self.block_size = block_size
+        self._latency = latency
+        self.device = device
+        self.latency = None
+        self._stream = None
+
+    def start(self, callback):
+        self._stream = self._sd.OutputStream(samplerate=self.fs, blocksize=self.block_size, channels=2,
+                                             dtype='float32', latency=self._latency, device=self.device,
+                                             callback=callback)
+        self._stream.start()
+        self.latency = self._stream.latency
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+
+
+BACKENDS = {
+    "null": NullBackend,
+    "file": FileSinkBackend,
+    "sounddevice": SoundDeviceBackend,
+}
+
+
+class RealtimePlayer:
+    """
+    Renders blocks on demand inside an output stream callback.
+
+    Each callback reads one block from every input (objects with a
+    read(n) method, such as noise.NoiseGenerator), optionally moves the
+    sources to angles(t) and runs one renderer.process() call into a
+    preallocated buffer, so the work per callback is bounded by the block
+    size and nothing is rendered ahead. Every callback is timed: a
+    deadline miss is a callback that took longer than the audio it
+    produced, and the end-to-end latency of a block is the callback time
+    plus the output latency of the backend.
+
+    Parameters:
+    - renderer: a StreamRenderer or STFTRenderer with one source per input
+    - inputs: one block source per renderer source
+    - angles: optional function of the stream time in seconds returning
+      the azimuth of every source
+    - backend: "null", "file", "sounddevice" or a backend object
+    """
+
+    def __init__(self, renderer, inputs, angles=None, backend="sounddevice", max_callbacks=1 << 16, **backend_kwargs):
+        self.renderer = renderer
+        self.inputs = inputs
+        self.angles = angles
+        self.fs = renderer.fs
+        self.block_size = renderer.block_size
+        if isinstance(backend, str):
+            backend = BACKENDS[backend](self.fs, self.block_size, **backend_kwargs)
+        self.backend = backend
+        while len(renderer) < len(inputs):
+            renderer.add_source(0.0)
+
+        self._x = np.zeros((len(inputs), self.block_size))
+        self._out = np.zeros((self.block_size, 2))
+        self.durations = np.zeros(max_callbacks) # ring buffer of callback times in seconds
+        self.callbacks = 0
+        self.misses = 0
+        self.underflows = 0
+        self.samples = 0
+        self.startup_latency = None
+        self._started = None
+
+    def _callback(self, outdata, frames, time_info, status):
+        t0 = time.perf_counter()
+        if status:
+            self.underflows += 1
+        for start in range(0, frames, self.block_size):
+            n = min(self.block_size, frames - start)
+            for i, source in enumerate(self.inputs):
+                self._x[i, :n] = source.read(n)
+            angles = None if self.angles is None else self.angles(self.samples / self.fs)
+            out = self.renderer.process(self._x[:, :n], angles, out=self._out[:n])
+            outdata[start:start + n] = out
+            self.samples += n
+
+        duration = time.perf_counter() - t0
+        self.durations[self.callbacks % len(self.durations)] = duration
+        self.callbacks += 1
+        if duration > frames / self.fs:
+            self.misses += 1
+        if self.startup_latency is None:
+            self.startup_latency = time.perf_counter() - self._started
+
+    def start(self):
+        self._started = time.perf_counter()
+        self.backend.start(self._callback)
+
+    def stop(self):
+        self.backend.stop()
+
+    def run(self, duration):
+        # plays for duration seconds and returns the metrics
+        self.start()
+        try:
+            time.sleep(duration)
+        finally:
+            self.stop()
+        return self.metrics()
+
+    def metrics(self, percentiles=(50, 90, 99)):
+        durations = self.durations[:min(self.callbacks, len(self.durations))]
+        budget = self.block_size / self.fs
+        output_latency = self.backend.latency or 0.0
+        if isinstance(output_latency, (tuple, list)):
+            output_latency = max(output_latency)
+        metrics = {
+            "callbacks": self.callbacks,
+            "seconds_rendered": self.samples / self.fs,
+            "budget_ms": budget * 1e3,
+            "deadline_misses": self.misses,
+            "underflows": self.underflows,
+            "startup_latency_ms": None if self.startup_latency is None else self.startup_latency * 1e3,
+            "output_latency_ms": output_latency * 1e3,
+        }
+        if len(durations):
+            values = np.percentile(durations, percentiles)
+            metrics["callback_ms"] = {"mean": float(durations.mean() * 1e3), "max": float(durations.max() * 1e3),
+                                      **{f"p{p}": float(v * 1e3) for p, v in zip(percentiles, values)}}
+            metrics["end_to_end_ms"] = {f"p{p}": float((v + output_latency) * 1e3) for p, v in zip(percentiles, values)}
+            metrics["headroom"] = float(1 - values[-1] / budget)
+        return metrics
+
+    def report(self):
+        m = self.metrics()
+        lines = [f"{m['callbacks']} callbacks, {m['seconds_rendered']:.2f} s rendered, "
+                 f"{m['deadline_misses']} deadline misses, {m['underflows']} underflows"]
+        if "callback_ms" in m:
+            c = m["callback_ms"]
+            lines.append(f"callback: mean {c['mean']:.3f} ms, p99 {c['p99']:.3f} ms, max {c['max']:.3f} ms "
+                         f"of {m['budget_ms']:.2f} ms budget ({m['headroom'] * 100:.0f}% headroom at p99)")
+            lines.append(f"end-to-end latency p99: {m['end_to_end_ms']['p99']:.2f} ms, "
+                         f"startup: {m['startup_latency_ms']:.2f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,165 @@
+## Renders mono WAV files to binaural stereo with the hrtiir + ITD model
+## Files are streamed in chunks, so memory use does not depend on their length.
+##
+##   python render_binaural.py input.wav output.wav --azimuth 45
+##   python render_binaural.py input.wav output.wav --trajectory path.txt
+##   python render_binaural.py recordings/ binaural/ --azimuth -30 --workers 4
+##
+## A trajectory file has one "time_s angle_deg" pair per line, angles in
+## between are interpolated and held constant after the last line.
+
+import argparse
+import glob
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.io import wavfile
+from binaural_stream import StreamRenderer
+from scene import trajectory_angles
+
+
+def load_trajectory(filename):
+    # (K, 2) array of (time, angle) key frames
+    return np.atleast_2d(np.loadtxt(filename, dtype=np.float64))
+
+def _read_mapped(filename):
+    try:
+        return wavfile.read(filename, mmap=True)
+    except ValueError:
+        # 24-bit and a few other formats cannot be memory mapped
+        return wavfile.read(filename)
+
+def _to_float(samples):
+    # integer PCM to [-1, 1)
+    if np.issubdtype(samples.dtype, np.integer):
+        info = np.iinfo(samples.dtype)
+        offset = (info.max + 1) // 2 if info.min == 0 else 0 # 8 bit WAV is unsigned
+        return (samples.astype(np.float64) - offset) / (info.max + 1 - offset)
+    return samples.astype(np.float64)
+
+def render_file(input_file, output_file, angles=0.0, h_radius=0.09, c_air=343, gain=1.0, channel=0,
+                block_size=512, chunk_size=65536):
+    """
+    Renders one mono file (or one channel of it) to a 16 bit stereo WAV.
+
+    Parameters:
+    - angles: fixed azimuth in degrees, (time, angle) key frames or a function of time
+    - gain: applied before conversion to 16 bit, samples beyond full scale are clipped
+    - block_size: samples per renderer block, the azimuth is updated per block
+    - chunk_size: samples read and written at a time, rounded up to whole blocks
+
+    The output is block_size + max_itd_samples longer than the input, so
+    the ITD delay and the filter tail of the last samples are kept.
+    """
+    rate, data = _read_mapped(input_file)
+    if data.ndim > 1:
+        data = data[:, channel]
+    N = len(data)
+    chunk_size = -(-chunk_size // block_size) * block_size
+
+    renderer = StreamRenderer(rate, h_radius, c_air, block_size)
+    renderer.add_source(float(trajectory_angles(angles, 0.0)))
+    clipped = 0
+
+    def write(out, y):
+        nonlocal clipped
+        y *= gain * 32767
+        clipped += int(np.count_nonzero(np.abs(y) > 32767))
+        out.writeframes(np.clip(np.rint(y), -32768, 32767).astype('<i2').tobytes())
+
+    with wave.open(output_file, 'wb') as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        for start in range(0, N, chunk_size):
+            stop = min(start + chunk_size, N)
+            x = _to_float(data[start:stop])
+            block_angles = trajectory_angles(angles, np.arange(start, stop, block_size) / rate)
+            y = np.zeros((stop - start, 2))
+            for k, b in enumerate(range(0, stop - start, block_size)):
+                e = min(b + block_size, stop - start)
+                renderer.process(x[None, b:e], block_angles[k:k + 1], out=y[b:e])
+            write(out, y)
+
+        # flush the delay lines and filter tail with silence at the last angle
+        tail = block_size + renderer.max_delay
+        y = np.zeros((tail, 2))
+        silence = np.zeros((1, block_size))
+        for b in range(0, tail, block_size):
+            e = min(b + block_size, tail)
+            renderer.process(silence[:, :e - b], out=y[b:e])
+        write(out, y)
+
+    return {"file": input_file, "output": output_file, "samples": N, "seconds": N / rate, "clipped": clipped}
+
+def _render_job(args):
+    input_file, output_file, kwargs = args
+    try:
+        return render_file(input_file, output_file, **kwargs), None
+    except Exception as e:
+        return {"file": input_file, "output": output_file}, str(e)
+
+def render_directory(input_dir, output_dir, workers=None, pattern="*.wav", **kwargs):
+    # every matching file to output_dir under the same name, one file per worker process at a time
+    files = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(f, os.path.join(output_dir, os.path.basename(f)), kwargs) for f in files]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+
+    start = time.perf_counter()
+    if workers == 1:
+        results = list(map(_render_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_job, jobs))
+    wall = time.perf_counter() - start
+
+    seconds = 0.0
+    for info, error in results:
+        if error is not None:
+            print(f"Error rendering {info['file']}: {error}")
+            continue
+        seconds += info["seconds"]
+        if info["clipped"]:
+            print(f"Warning: {info['clipped']} samples clipped in {info['output']}")
+    print(f"Rendered {len(files)} files ({seconds:.1f} s of audio) to {output_dir}/ in {wall:.2f} s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render mono WAV files to binaural stereo")
+    parser.add_argument("input", help="mono WAV file or directory of WAV files")
+    parser.add_argument("output", help="stereo WAV file or output directory")
+    direction = parser.add_mutually_exclusive_group()
+    direction.add_argument("--azimuth", type=float, default=0.0, help="fixed azimuth in degrees")
+    direction.add_argument("--trajectory", help="text file with time_s angle_deg per line")
+    parser.add_argument("--h-radius", type=float, default=0.09)
+    parser.add_argument("--c-air", type=float, default=343)
+    parser.add_argument("--gain", type=float, default=1.0)
+    parser.add_argument("--channel", type=int, default=0, help="channel of multichannel input files")
+    parser.add_argument("--block-size", type=int, default=512)
+    parser.add_argument("--chunk-size", type=int, default=65536)
+    parser.add_argument("--workers", type=int, default=None, help="processes for directory mode")
+    parser.add_argument("--pattern", default="*.wav", help="file pattern for directory mode")
+    args = parser.parse_args()
+
+    kwargs = {
+        "angles": load_trajectory(args.trajectory) if args.trajectory else args.azimuth,
+        "h_radius": args.h_radius,
+        "c_air": args.c_air,
+        "gain": args.gain,
+        "channel": args.channel,
+        "block_size": args.block_size,
+        "chunk_size": args.chunk_size,
+    }
+    if os.path.isdir(args.input):
+        render_directory(args.input, args.output, args.workers, args.pattern, **kwargs)
+    else:
+        info = render_file(args.input, args.output, **kwargs)
+        print(f"Rendered {info['seconds']:.1f} s to: {args.output}")
+        if info["clipped"]:
+            print(f"Warning: {info['clipped']} samples clipped, lower --gain")
@@ -0,0 +1,157 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from binaural_stream import StreamRenderer
+
+
+def trajectory_angles(angles, times):
+    """
+    Azimuth of a source at the given times in seconds.
+
+    Parameters:
+    - angles: a fixed angle, a function of time, or (time, angle) key
+      frames as a (K, 2) array that are linearly interpolated
+    """
+    if callable(angles):
+        return np.broadcast_to(np.asarray(angles(times), dtype=np.float64), np.shape(times))
+    angles = np.asarray(angles, dtype=np.float64)
+    if angles.ndim == 0:
+        return np.full(np.shape(times), float(angles))
+    return np.interp(times, angles[:, 0], angles[:, 1])
+
+
+class Scene:
+    """
+    Mono sources with azimuth trajectories mixed to one binaural signal.
+
+    Sources are split into fixed groups of group_size, each group has its
+    own StreamRenderer and the scene is rendered chunk by chunk of
+    chunk_size samples. In every chunk the groups are rendered in a
+    worker pool and their outputs summed in group order, so the mix does
+    not depend on the number of workers and memory is bounded by the
+    chunk size, not by the scene length.
+
+    Parameters:
+    - fs, h_radius, c_air: model parameters, as for hrtiir and hrir
+    - block_size: samples per renderer block, angles change per block
+    - group_size: sources per renderer, the unit of work for the pool
+    """
+
+    def __init__(self, fs=44100, h_radius=0.09, c_air=343, block_size=512, group_size=32):
+        self.fs = fs
+        self.h_radius = h_radius
+        self.c_air = c_air
+        self.block_size = block_size
+        self.group_size = group_size
+        self.sources = []
+        self.stats = None
+
+    def add_source(self, signal, angles=0.0, start=0.0, gain=1.0):
+        # start is the time in seconds where the source begins in the scene
+        self.sources.append({"signal": np.asarray(signal), "angles": angles,
+                             "start": int(round(start * self.fs)), "gain": gain})
+        return len(self.sources) - 1
+
+    def __len__(self):
+        return len(self.sources)
+
+    @property
+    def length(self):
+        return max((s["start"] + len(s["signal"]) for s in self.sources), default=0)
+
+    def _chunk_job(self, group, renderer, start, stop):
+        # source blocks and per block angles of one group for samples [start, stop)
+        x = np.zeros((len(group), stop - start))
+        for row, i in enumerate(group):
+            src = self.sources[i]
+            a = max(start, src["start"])
+            b = min(stop, src["start"] + len(src["signal"]))
+            if a < b:
+                x[row, a - start:b - start] = src["signal"][a - src["start"]:b - src["start"]] * src["gain"]
+        times = np.arange(start, stop, self.block_size) / self.fs
+        angles = np.array([trajectory_angles(self.sources[i]["angles"], times) for i in group])
+        return renderer, x, angles
+
+    def stream(self, chunk_size=44100, workers=None, processes=False):
+        """
+        Yields the (n, 2) mix chunk by chunk.
+
+        Parameters:
+        - chunk_size: samples per chunk, rounded up to whole blocks
+        - workers: pool size, None for one per CPU, 1 renders in this thread
+        - processes: use a process pool instead of threads
+        """
+        chunk_size = -(-chunk_size // self.block_size) * self.block_size
+        groups = [list(range(i, min(i + self.group_size, len(self))))
+                  for i in range(0, len(self), self.group_size)]
+        renderers = [StreamRenderer(self.fs, self.h_radius, self.c_air, self.block_size) for _ in groups]
+        for renderer, group in zip(renderers, groups):
+            for i in group:
+                renderer.add_source(float(trajectory_angles(self.sources[i]["angles"], 0.0)))
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(groups)))
+        pool = None
+        if workers > 1:
+            pool = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers)
+
+        start_time = time.perf_counter()
+        N = self.length
+        # a source is audible from its start until its filter tail and delay have passed
+        tail = self.block_size + renderers[0].max_delay if renderers else 0
+        spans = [(s["start"], s["start"] + len(s["signal"]) + tail) for s in self.sources]
+        try:
+            for start in range(0, N, chunk_size):
+                stop = min(start + chunk_size, N)
+                # groups without an audible source in this chunk are skipped
+                active = [k for k, group in enumerate(groups)
+                          if any(spans[i][0] < stop and spans[i][1] > start for i in group)]
+                for k in set(range(len(groups))) - set(active):
+                    renderers[k].reset()
+                jobs = [self._chunk_job(groups[k], renderers[k], start, stop) for k in active]
+                outputs = map(_render_chunk, jobs) if pool is None else pool.map(_render_chunk, jobs)
+
+                mix = np.zeros((stop - start, 2))
+                for k, (renderer, out) in zip(active, outputs):
+                    renderers[k] = renderer # processes send back the updated filter state
+                    mix += out
+                yield mix
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        wall = time.perf_counter() - start_time
+        source_seconds = sum(len(s["signal"]) for s in self.sources) / self.fs
+        self.stats = {
+            "sources": len(self),
+            "groups": len(groups),
+            "workers": workers,
+            "scene_s": N / self.fs,
+            "wall_s": wall,
+            "source_seconds": source_seconds,
+            "source_s_per_s": source_seconds / wall if wall > 0 else None,
+            "realtime_factor": N / self.fs / wall if wall > 0 else None,
+        }
+
+    def render(self, chunk_size=44100, workers=None, processes=False):
+        # the whole scene as one preallocated (N, 2) array
+        out = np.zeros((self.length, 2))
+        pos = 0
+        for mix in self.stream(chunk_size, workers, processes):
+            out[pos:pos + len(mix)] = mix
+            pos += len(mix)
+        print(f"Rendered {self.stats['source_seconds']:.1f} source-seconds in {self.stats['wall_s']:.3f} s "
+              f"({self.stats['source_s_per_s']:.1f} source-s/s, {self.stats['workers']} workers)")
+        return out
+
+
+def _render_chunk(args):
+    renderer, x, angles = args
+    n = x.shape[1]
+    out = np.zeros((n, 2))
+    for k, start in enumerate(range(0, n, renderer.block_size)):
+        stop = min(start + renderer.block_size, n)
+        renderer.process(x[:, start:stop], angles[:, k], out=out[start:stop])
+    return renderer, out